@@ -0,0 +1,207 @@
+import os
+import threading
+
+import numpy as np
+
+from perf import metrics
+
+RANKED_QUEUE_ID = 1100
+
+
+def _pretty_trait_name(trait_name: str) -> str:
+    # "TFT16_Demacia" -> "Demacia"
+    return trait_name.split("_")[-1].title()
+
+
+def main_comp(participant, set_prefix="TFT16_"):
+    """
+    Nom de la compo d'un participant (son trait "principal" : plus haut
+    tier_current puis num_units), None s'il n'a pas joué le set voulu.
+    """
+    traits = participant.traits
+    if participant.placement is None or not traits:
+        return None
+    if not any(name.startswith(set_prefix) for name, _, _ in traits):
+        return None
+    main_trait = max(traits, key=lambda t: (t[1], t[2]))
+    return _pretty_trait_name(main_trait[0] or "Unknown")
+
+
+class CompAnalytics:
+    """
+    Table en colonnes (tableaux NumPy) des parties ranked :
+    une ligne (puuid, match_id, compo, placement, timestamp) par participant.
+    Les chaînes sont stockées une fois dans un dictionnaire et référencées par
+    index, et les agrégats (par compo, par joueur ou sur tout le roster) sont
+    de simples bincount : quelques ms même avec des dizaines de milliers de games.
+    save() tourne dans un thread pendant que la boucle ajoute des matchs et lit
+    la table : un verrou protège les lignes en attente et leur intégration.
+    La table a son propre high-water mark par joueur (dernier match ingéré), sauvé
+    avec elle : chaque process a sa table, alors que celui des stats de compos est
+    partagé par tous (Storage).
+    """
+
+    def __init__(self, path=None, set_prefix="TFT16_"):
+        self.path = path
+        self.set_prefix = set_prefix
+        self._lock = threading.Lock()
+        self._puuids, self._puuid_idx = [], {}
+        self._comps, self._comp_idx = [], {}
+        self._match_ids, self._match_idx = [], {}
+        self._puuid = np.empty(0, dtype=np.int32)
+        self._match = np.empty(0, dtype=np.int32)
+        self._comp = np.empty(0, dtype=np.int32)
+        self._placement = np.empty(0, dtype=np.int8)
+        self._timestamp = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._last_match = {}
+
+    def __len__(self):
+        return len(self._placement) + len(self._pending)
+
+    @staticmethod
+    def _intern(value, values, index):
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(values)
+            values.append(value)
+        return i
+
+    def add_match(self, match):
+        """Ajoute les participants d'un MatchRecord ranked (une seule fois par match)."""
+        if match.queue_id != RANKED_QUEUE_ID:
+            return
+        comps = [(p, main_comp(p, self.set_prefix)) for p in match.participants]
+        with self._lock:
+            if match.match_id in self._match_idx:
+                return
+            m = self._intern(match.match_id, self._match_ids, self._match_idx)
+            for p, comp in comps:
+                if comp is None:
+                    continue
+                self._pending.append((
+                    self._intern(p.puuid, self._puuids, self._puuid_idx),
+                    m,
+                    self._intern(comp, self._comps, self._comp_idx),
+                    p.placement,
+                    match.game_datetime or 0,
+                ))
+
+    def last_match_id(self, puuid):
+        """Dernier match du joueur déjà ingéré dans cette table (None : jamais)."""
+        with self._lock:
+            return self._last_match.get(puuid)
+
+    def set_last_match_id(self, puuid, match_id):
+        with self._lock:
+            self._last_match[puuid] = match_id
+
+    def _flush(self):
+        """Intègre les lignes en attente aux colonnes (appelé sous self._lock)."""
+        if not self._pending:
+            return
+        puuid, match, comp, placement, timestamp = zip(*self._pending)
+        self._puuid = np.concatenate([self._puuid, np.asarray(puuid, dtype=np.int32)])
+        self._match = np.concatenate([self._match, np.asarray(match, dtype=np.int32)])
+        self._comp = np.concatenate([self._comp, np.asarray(comp, dtype=np.int32)])
+        self._placement = np.concatenate([self._placement, np.asarray(placement, dtype=np.int8)])
+        self._timestamp = np.concatenate([self._timestamp, np.asarray(timestamp, dtype=np.int64)])
+        self._pending = []
+
+    def comp_table(self, puuids=None, min_games=1, since=None):
+        """
+        Stats par compo, triées par placement moyen :
+        [{"comp", "games", "players", "avg_placement", "top4_rate", "top1_rate"}, ...]
+        `puuids` limite aux joueurs donnés (un joueur ou tout le roster suivi).
+        """
+        with self._lock:
+            self._flush()
+            # Les colonnes sont remplacées (jamais modifiées en place) : ces références restent valides
+            puuid_col, comp_col, placement_col, timestamp_col = self._puuid, self._comp, self._placement, self._timestamp
+            comps, n_puuids = list(self._comps), len(self._puuids)
+            wanted = None if puuids is None else [self._puuid_idx[p] for p in puuids if p in self._puuid_idx]
+        mask = np.ones(len(placement_col), dtype=bool)
+        if wanted is not None:
+            mask &= np.isin(puuid_col, np.asarray(wanted, dtype=np.int32))
+        if since is not None:
+            mask &= timestamp_col >= since
+
+        comp = comp_col[mask]
+        placement = placement_col[mask].astype(np.float64)
+        n = len(comps)
+        games = np.bincount(comp, minlength=n)
+        placement_sum = np.bincount(comp, weights=placement, minlength=n)
+        top4 = np.bincount(comp, weights=placement <= 4, minlength=n)
+        top1 = np.bincount(comp, weights=placement == 1, minlength=n)
+
+        # Joueurs distincts par compo : couples (compo, joueur) uniques
+        pairs = np.unique(comp.astype(np.int64) * max(1, n_puuids) + puuid_col[mask])
+        players = np.bincount(pairs // max(1, n_puuids), minlength=n)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg = placement_sum / games
+            top4_rate = top4 * 100 / games
+            top1_rate = top1 * 100 / games
+
+        rows = []
+        for i in np.flatnonzero(games >= max(1, min_games)):
+            rows.append({
+                "comp": comps[i],
+                "games": int(games[i]),
+                "players": int(players[i]),
+                "avg_placement": round(float(avg[i]), 2),
+                "top4_rate": round(float(top4_rate[i]), 1),
+                "top1_rate": round(float(top1_rate[i]), 1),
+            })
+        rows.sort(key=lambda r: (r["avg_placement"], -r["games"]))
+        return rows
+
+    # ---------- Persistance ----------
+
+    def save(self):
+        if not self.path:
+            return
+        # Copie cohérente sous le verrou, compression et écriture en dehors
+        with self._lock:
+            self._flush()
+            columns = dict(
+                puuids=np.asarray(self._puuids, dtype=str),
+                comps=np.asarray(self._comps, dtype=str),
+                match_ids=np.asarray(self._match_ids, dtype=str),
+                puuid=self._puuid, match=self._match, comp=self._comp,
+                placement=self._placement, timestamp=self._timestamp,
+                last_puuids=np.asarray(list(self._last_match), dtype=str),
+                last_match_ids=np.asarray(list(self._last_match.values()), dtype=str),
+                set_prefix=np.asarray(self.set_prefix),
+            )
+        tmp = self.path + ".tmp.npz"
+        with metrics.timer("storage_seconds", op="analytics_save"):
+            np.savez_compressed(tmp, **columns)
+            os.replace(tmp, self.path)
+
+    def load(self):
+        """
+        Recharge la table sauvegardée, False s'il n'y en a pas encore ou si elle
+        est d'un autre set (elle est alors à reconstruire pour le set courant).
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with self._lock, np.load(self.path, allow_pickle=False) as data:
+            # Tables sauvées avant le préfixe : set inconnu, reconstruites aussi
+            if "set_prefix" not in data.files or str(data["set_prefix"]) != self.set_prefix:
+                return False
+            self._puuids = data["puuids"].tolist()
+            self._comps = data["comps"].tolist()
+            self._match_ids = data["match_ids"].tolist()
+            self._puuid, self._match, self._comp = data["puuid"], data["match"], data["comp"]
+            self._placement, self._timestamp = data["placement"], data["timestamp"]
+            # Absents des tables sauvées avant les high-water marks : tout sera repris
+            if "last_puuids" in data.files:
+                self._last_match = dict(zip(data["last_puuids"].tolist(), data["last_match_ids"].tolist()))
+            else:
+                self._last_match = {}
+            self._puuid_idx = {p: i for i, p in enumerate(self._puuids)}
+            self._comp_idx = {c: i for i, c in enumerate(self._comps)}
+            self._match_idx = {m: i for i, m in enumerate(self._match_ids)}
+            self._pending = []
+        return True
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import math
+import os
+from io import BytesIO
+
+from PIL import Image
+
+CDRAGON_TFT_DATA = "https://raw.communitydragon.org/latest/cdragon/tft/en_us.json"
+ATLAS_COLUMNS = 16
+
+
+def atlas_paths(atlas_dir, tft_set, size):
+    base = os.path.join(atlas_dir, f"atlas_set{tft_set}_{size}")
+    return base + ".png", base + ".json"
+
+
+class SpriteAtlas:
+    """
+    Toutes les icônes d'un set, redimensionnées une fois et collées dans une seule
+    image (+ index JSON character_id -> position). On décode l'atlas une seule fois,
+    puis chaque icône n'est qu'un découpage, sans décodage ni resize.
+    """
+
+    def __init__(self, image, index, size):
+        self.image = image
+        self.index = index
+        self.size = size
+
+    def __contains__(self, character_id):
+        return character_id.lower() in self.index
+
+    def icon(self, character_id):
+        pos = self.index.get(character_id.lower())
+        if pos is None:
+            return None
+        x, y = pos
+        return self.image.crop((x, y, x + self.size, y + self.size))
+
+    @classmethod
+    def load(cls, png_path, index_path):
+        """Atlas depuis le disque, None s'il n'a pas encore été construit."""
+        if not (os.path.exists(png_path) and os.path.exists(index_path)):
+            return None
+        with open(index_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        image = Image.open(png_path).convert("RGBA")
+        return cls(image, {cid: tuple(pos) for cid, pos in meta['icons'].items()}, meta['size'])
+
+
+def _set_champions(tft_data, tft_set):
+    """character_id des champions jouables du set, d'après les données CommunityDragon."""
+    champions = tft_data.get('sets', {}).get(str(tft_set), {}).get('champions')
+    if champions is None:
+        champions = next(
+            (s.get('champions', []) for s in tft_data.get('setData', []) if s.get('number') == int(tft_set)),
+            []
+        )
+    prefix = f"tft{tft_set}_"
+    return sorted({
+        c['apiName'].lower() for c in champions
+        if c.get('apiName', '').lower().startswith(prefix) and c.get('traits')
+    })
+
+
+def _pack(icons, size, png_path, index_path, tft_set):
+    """Colle les icônes (bytes PNG) dans une grille et écrit atlas + index."""
+    decoded = {}
+    for cid, data in icons.items():
+        try:
+            decoded[cid] = Image.open(BytesIO(data)).convert("RGBA").resize((size, size))
+        except OSError:
+            continue
+
+    columns = min(ATLAS_COLUMNS, max(1, len(decoded)))
+    rows = max(1, math.ceil(len(decoded) / columns))
+    atlas = Image.new("RGBA", (columns * size, rows * size), (0, 0, 0, 0))
+    index = {}
+    for i, (cid, img) in enumerate(sorted(decoded.items())):
+        x, y = (i % columns) * size, (i // columns) * size
+        atlas.paste(img, (x, y))
+        index[cid] = [x, y]
+
+    os.makedirs(os.path.dirname(png_path) or '.', exist_ok=True)
+    atlas.save(png_path + ".tmp", format="PNG")
+    with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({'set': str(tft_set), 'size': size, 'icons': index}, f)
+    os.replace(png_path + ".tmp", png_path)
+    os.replace(index_path + ".tmp", index_path)
+
+
+async def build_atlas(riot, url_for, atlas_dir, tft_set, size=80, concurrency=8,
+                      data_url=CDRAGON_TFT_DATA):
+    """
+    Télécharge une fois toutes les icônes du set et construit l'atlas sur disque.
+    `url_for(character_id)` donne l'URL CommunityDragon d'une icône, `data_url`
+    celle des données TFT (liste des champions du set).
+    """
+    raw = await riot.get_bytes(data_url)
+    if raw is None:
+        return None
+    champions = _set_champions(json.loads(raw), tft_set)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(cid):
+        async with semaphore:
+            return cid, await riot.get_bytes(url_for(cid))
+
+    icons = {cid: data for cid, data in await asyncio.gather(*(fetch(c) for c in champions)) if data}
+    if not icons:
+        return None
+
+    png_path, index_path = atlas_paths(atlas_dir, tft_set, size)
+    await asyncio.to_thread(_pack, icons, size, png_path, index_path, tft_set)
+    return await asyncio.to_thread(SpriteAtlas.load, png_path, index_path)
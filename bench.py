@@ -0,0 +1,271 @@
+"""
+Banc de mesure de bout en bout des commandes du bot, contre le faux serveur
+Riot / CommunityDragon de mock_riot.py (aucune clé ni connexion Discord).
+
+Pour chaque taille de roster, le bot est chargé dans un processus neuf (base
+SQLite et caches vides dans un dossier temporaire), le roster est enregistré,
+puis les callbacks des commandes sont appelés avec un faux contexte. On affiche
+p50 / p95 de la durée de chaque commande, p50 du délai avant le premier message
+(les réponses progressives sont ensuite éditées) et le nombre d'appels reçus
+par le serveur (total et par endpoint).
+
+    python bench.py --sizes 10 100 500 --runs 20 --latency 0.03 --jitter 0.01
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from mock_riot import Fixtures, MockRiotServer
+
+COMMANDS = ["classement", "nolife", "stats", "ranked", "history", "meta"]
+# Tâches de fond mesurées comme les commandes (avant elles : état "en régime")
+JOBS = ["refresh_leaderboard", "ingest_roster"]
+
+
+class FakeMessage:
+    def __init__(self):
+        self.created_at = datetime.now(timezone.utc)
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeSentMessage:
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    async def edit(self, **kwargs):
+        self.ctx.edits.append(kwargs)
+
+
+class FakeContext:
+    """
+    Juste ce que les commandes utilisent d'un commands.Context : ctx.defer, ctx.send
+    (message éditable), ctx.message et ctx.guild. Garde l'instant du premier envoi.
+    """
+
+    created = []
+
+    def __init__(self, guild_id=1):
+        self.message = FakeMessage()
+        self.guild = FakeGuild(guild_id)
+        self.sent = []
+        self.edits = []
+        self.first_sent_at = None
+        FakeContext.created.append(self)
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def send(self, content=None, **kwargs):
+        if self.first_sent_at is None:
+            self.first_sent_at = time.perf_counter()
+        self.sent.append((content, kwargs))
+        return FakeSentMessage(self)
+
+
+def percentile(values, pct):
+    """Percentile au rang le plus proche (values non vide)."""
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def _timed(server, fn):
+    before = sum(server.calls.values())
+    before_by_endpoint = Counter(server.calls)
+    FakeContext.created.clear()
+    start = time.perf_counter()
+    error = None
+    try:
+        await fn()
+    except Exception as e:
+        error = repr(e)
+    elapsed = time.perf_counter() - start
+    # Délai avant le premier message (toute la durée pour les tâches de fond)
+    sent_at = [ctx.first_sent_at for ctx in FakeContext.created if ctx.first_sent_at is not None]
+    first_response = min(sent_at) - start if sent_at else elapsed
+    calls = Counter(server.calls)
+    calls.subtract(before_by_endpoint)
+    return elapsed, first_response, sum(server.calls.values()) - before, +calls, error
+
+
+async def run_size(args, size):
+    fixtures = Fixtures.generate(size, args.matches_per_player, args.tft_set, args.seed, tuple(args.platforms))
+    server = MockRiotServer(
+        fixtures, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        retry_after=args.retry_after, app_limits=args.app_limits, port=0, seed=args.seed,
+        method_limits={} if args.no_method_limits else None,
+    )
+    await server.start()
+
+    data_dir = tempfile.mkdtemp(prefix=f"tft-bench-{size}-")
+    # À fixer avant l'import : bot_tft lit sa config au chargement
+    os.environ.update({
+        'DATA_DIR': data_dir,
+        'RIOT_BASE_URL': server.riot_base_url,
+        'CDRAGON_BASE': server.cdragon_base,
+        'RIOT_API_KEY': 'bench',
+        'TFT_SET': fixtures.tft_set,
+        'RENDER_POOL': args.render_pool,
+    })
+    bot_tft = importlib.import_module("bot_tft")
+    bot = bot_tft.bot
+
+    await bot.riot.start()
+    await bot.players.load()
+    # Roster réparti sur --guilds serveurs ; une part --overlap des joueurs est suivie sur deux serveurs
+    rng = random.Random(args.seed)
+    guild_ids = list(range(1, args.guilds + 1))
+    for i, (name, _, puuid) in enumerate(fixtures.riot_ids()):
+        guilds = {guild_ids[i % len(guild_ids)]}
+        if len(guild_ids) > 1 and rng.random() < args.overlap:
+            guilds.add(rng.choice(guild_ids))
+        for guild_id in guilds:
+            await bot.players.add(guild_id, name, puuid, fixtures.platform(puuid))
+    if not args.no_atlas:
+        await bot.load_atlas()
+    setup_calls = sum(server.calls.values())
+
+    def pick():
+        """(contexte d'un serveur au hasard, pseudo d'un de ses joueurs)."""
+        guild_id = rng.choice(guild_ids)
+        return FakeContext(guild_id), rng.choice(bot.players.roster(guild_id))['name']
+
+    def on_player(command):
+        ctx, name = pick()
+        return command.callback(ctx, name=name)
+
+    scenarios = {
+        "refresh_leaderboard": lambda: bot_tft.refresh_leaderboard(guild_ids),
+        "ingest_roster": lambda: bot_tft.ingest_roster(guild_ids=guild_ids),
+        "classement": lambda: bot_tft.classement.callback(pick()[0]),
+        "nolife": lambda: bot_tft.nolife.callback(pick()[0]),
+        "stats": lambda: on_player(bot_tft.stats),
+        "ranked": lambda: on_player(bot_tft.ranked),
+        "history": lambda: on_player(bot_tft.history),
+        "meta": lambda: bot_tft.meta.callback(pick()[0]),
+    }
+
+    results = []
+    for label in (JOBS if not args.no_jobs else []) + COMMANDS:
+        runs = args.job_runs if label in JOBS else args.runs
+        times, first_responses, calls, errors = [], [], [], []
+        endpoints = Counter()
+        for _ in range(runs):
+            elapsed, first_response, n_calls, by_endpoint, error = await _timed(server, scenarios[label])
+            times.append(elapsed)
+            first_responses.append(first_response)
+            calls.append(n_calls)
+            endpoints.update(by_endpoint)
+            if error:
+                errors.append(error)
+        results.append({
+            'command': label,
+            'runs': runs,
+            'p50_ms': round(percentile(times, 50) * 1000, 1),
+            'p95_ms': round(percentile(times, 95) * 1000, 1),
+            'first_ms': round(times[0] * 1000, 1),
+            'response_p50_ms': round(percentile(first_responses, 50) * 1000, 1),
+            'calls_per_run': round(sum(calls) / runs, 1),
+            'calls_max': max(calls),
+            'endpoints': dict(endpoints),
+            'errors': len(errors),
+            'first_error': errors[0] if errors else None,
+        })
+
+    await bot.riot.close()
+    bot.riot.match_store.close()
+    bot.storage.close()
+    bot.renderer.close()
+    await server.stop()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return {
+        'size': size,
+        'guilds': args.guilds,
+        'matches': len(fixtures.matches),
+        'setup_calls': setup_calls,
+        'statuses': {f"{endpoint} {status}": n for (endpoint, status), n in server.statuses.items()},
+        'results': results,
+    }
+
+
+def print_report(report, args):
+    print(f"\n=== Roster de {report['size']} joueurs sur {report['guilds']} serveur(s) ({report['matches']} matchs) | "
+          f"latence {args.latency * 1000:.0f} ms ±{args.jitter * 1000:.0f} | 429 injectés {args.error_rate:.1%} ===")
+    print(f"Appels à l'installation (atlas) : {report['setup_calls']}")
+    print(f"{'commande':<20} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'1er ms':>9} {'1er msg':>9} "
+          f"{'appels/run':>11} {'max':>6} {'err':>4}  endpoints")
+    for r in report['results']:
+        endpoints = ' '.join(f"{k}:{v}" for k, v in sorted(r['endpoints'].items()))
+        print(f"{r['command']:<20} {r['runs']:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['first_ms']:>9} "
+              f"{r['response_p50_ms']:>9} {r['calls_per_run']:>11} {r['calls_max']:>6} {r['errors']:>4}  {endpoints}")
+        if r['first_error']:
+            print(f"    erreur : {r['first_error']}")
+    throttled = {k: v for k, v in report['statuses'].items() if k.endswith(' 429')}
+    if throttled:
+        print(f"429 renvoyés : {throttled}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de mesure des commandes du bot (serveur Riot simulé)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--runs', type=int, default=20, help="Appels par commande")
+    parser.add_argument('--job-runs', type=int, default=2, help="Passages par tâche de fond")
+    parser.add_argument('--no-jobs', action='store_true', help="Commandes à froid, sans poller ni ingestion avant")
+    parser.add_argument('--no-atlas', action='store_true', help="Icônes téléchargées une par une, sans atlas")
+    parser.add_argument('--matches-per-player', type=int, default=40)
+    parser.add_argument('--tft-set', default="16")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--platforms', nargs='+', default=['euw1'], help="Plateformes du roster (ex. euw1 na1 kr)")
+    parser.add_argument('--guilds', type=int, default=1, help="Nombre de serveurs Discord simulés")
+    parser.add_argument('--overlap', type=float, default=0.3, help="Part des joueurs suivis sur deux serveurs")
+    parser.add_argument('--latency', type=float, default=0.03, help="Latence simulée de Riot (s)")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Part de 429 'service' injectés")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--app-limits', default="2000:1", help="Limites annoncées par le serveur")
+    parser.add_argument('--no-method-limits', action='store_true',
+                        help="Sans limites par endpoint (sinon celles d'une clé de production)")
+    parser.add_argument('--render-pool', default="thread", choices=["thread", "process"])
+    parser.add_argument('--json', help="Écrit aussi les résultats dans ce fichier")
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        # Processus enfant : une seule taille, résultat en JSON sur stdout
+        report = asyncio.run(run_size(args, args.size))
+        print(json.dumps(report))
+        return
+
+    # Un processus par taille : bot_tft garde son état (bot, caches) au niveau du module
+    reports = []
+    child_args = sys.argv[1:]
+    for size in args.sizes:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *child_args, '--size', str(size)],
+            check=True, stdout=subprocess.PIPE, text=True,
+        ).stdout
+        report = json.loads(out.strip().splitlines()[-1])
+        print_report(report, args)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,179 +1,724 @@
 import discord
-from discord.ext import commands
-import aiohttp
-import json
+from discord import app_commands
+from discord.ext import commands, tasks
 import os
 import re
 from io import BytesIO
-from PIL import Image, ImageFont, ImageDraw
 import asyncio
+import time
+from contextlib import aclosing
+from leaderboard import TIER_VALUES, RANK_VALUES, Leaderboard, format_age, get_score, ladder_lp, score_label
+from ratelimit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from rendering import RenderCache, Renderer
+from analytics import CompAnalytics, main_comp
+from atlas import SpriteAtlas, atlas_paths, build_atlas
+from icon_cache import IconCache
+from lp_history import LPHistory
+from match_store import MatchStore
+from perf import metrics
+from riot_api import RIOT_BASE_URL, RiotAPIError, RiotClient, parse_platform, platform_label
+from storage import LEGACY_GUILD, PlayerRegistry, Storage, name_key, riot_id_key
 
 # CONFIG (change ici)
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 RIOT_API_KEY = os.getenv("RIOT_API_KEY")
+# Plateforme par défaut des joueurs ajoutés sans région (!add Toto#EUW)
 REGION = 'euw1'
-DATA_FILE = '/data/players.json'
-STATS_FILE = '/data/stats.json'
-CDRAGON_BASE = "https://raw.communitydragon.org/latest/game/assets/ux/tft/championsplashes/patching"
+# Dossier des données persistantes (base SQLite, caches d'icônes et de rendus)
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+DB_FILE = os.path.join(DATA_DIR, 'bot.db')
+# Anciens fichiers JSON, importés une seule fois dans DB_FILE
+DATA_FILE = os.path.join(DATA_DIR, 'players.json')
+STATS_FILE = os.path.join(DATA_DIR, 'stats.json')
+MATCH_DB_FILE = os.path.join(DATA_DIR, 'matches.db')
+ICON_CACHE_DIR = os.path.join(DATA_DIR, 'icons')
+# Fichiers suffixés par shard en multi-process (cf. shard_file)
+ANALYTICS_FILE = os.path.join(DATA_DIR, 'analytics.npz')
+# Historique binaire des LP (échantillons ajoutés par le poller, cf. !progress)
+LP_HISTORY_FILE = os.path.join(DATA_DIR, 'lp_history.bin')
+# Période affichée par défaut par !progress (jours)
+PROGRESS_DEFAULT_DAYS = 7
+# Durée de validité d'un Riot ID déjà résolu (un pseudo#tag peut changer de compte)
+RIOT_ID_TTL_DAYS = 30
+# Limites de !addmany : nombre de joueurs par commande et taille du fichier joint
+MAX_BULK_PLAYERS = 100
+MAX_BULK_FILE_BYTES = 64 * 1024
+# Nombre de games minimum pour qu'une compo apparaisse dans !meta
+META_MIN_GAMES = 3
+RENDER_CACHE_DIR = os.path.join(DATA_DIR, 'renders')
+# Set TFT courant (icônes CommunityDragon + atlas précalculé)
+TFT_SET = os.getenv("TFT_SET", "16")
+# Préfixe des traits du set courant : les compos des autres sets sont ignorées
+SET_PREFIX = f"TFT{TFT_SET}_"
+ATLAS_DIR = DATA_DIR
+# Fréquence de rafraîchissement du classement en tâche de fond (secondes)
+LEAGUE_REFRESH_SECONDS = int(os.getenv("LEAGUE_REFRESH_SECONDS", "300"))
+# Fréquence de mise à jour des compos de tout le roster (secondes)
+INGEST_REFRESH_SECONDS = int(os.getenv("INGEST_REFRESH_SECONDS", "1800"))
+# Rendu des images de compo : pool "thread" ou "process", et nombre de workers
+RENDER_POOL = os.getenv("RENDER_POOL", "thread")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+# Export Prometheus des mesures de perf (désactivé si vide) : endpoint HTTP /metrics
+# et/ou fichier réécrit toutes les PERF_DUMP_SECONDS (textfile collector)
+PERF_HOST = os.getenv("PERF_HOST", "0.0.0.0")
+PERF_PORT = int(os.getenv("PERF_PORT", "0"))
+PERF_DUMP_FILE = os.getenv("PERF_DUMP_FILE", "")
+PERF_DUMP_SECONDS = int(os.getenv("PERF_DUMP_SECONDS", "60"))
+# Sharding : nombre total de shards et shards gérés par ce process ("0-3" ou "0,2,4"),
+# pour répartir les serveurs sur plusieurs process. Vides : un seul process, nombre auto.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = os.getenv("SHARD_IDS", "")
+# Serveur qui récupère l'ancien roster global (sinon : le seul serveur du bot, s'il n'y en a
+# qu'un et un seul process ; obligatoire avec SHARD_IDS)
+LEGACY_GUILD_ID = int(os.getenv("LEGACY_GUILD_ID", "0"))
+# API Riot et CommunityDragon : surchargeables pour viser le serveur local de mock_riot.py
+RIOT_BASE_URL = os.getenv("RIOT_BASE_URL", RIOT_BASE_URL)
+CDRAGON_BASE = os.getenv("CDRAGON_BASE", "https://raw.communitydragon.org/latest")
+CDRAGON_TFT_DATA = f"{CDRAGON_BASE}/cdragon/tft/en_us.json"
+# Commandes slash : synchronisées avec Discord au démarrage (par le process du shard 0)
+SYNC_SLASH_COMMANDS = os.getenv("SYNC_SLASH_COMMANDS", "1") == "1"
+# Intervalle minimum entre deux éditions d'une réponse progressive (Discord : ~5 éditions / 5 s)
+PROGRESS_EDIT_SECONDS = 1.0
+# Budget de latence de chaque étape Riot d'une commande (secondes) : au-delà, on répond
+# avec les dernières données connues, marquées STALE_MARK, et la requête se termine en fond
+COMMAND_BUDGET_SECONDS = float(os.getenv("COMMAND_BUDGET_SECONDS", "2.5"))
+STALE_MARK = "🕒"
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
-
-# Valeurs pour trier les tiers (score = tier_value * 100 + LP)
-TIER_VALUES = {
-    'UNRANKED': 0, 'IRON': 100, 'BRONZE': 200, 'SILVER': 300, 'GOLD': 400,
-    'PLATINUM': 500, 'EMERALD': 600, 'DIAMOND': 700, 'MASTER': 800,
-    'GRANDMASTER': 900, 'CHALLENGER': 1000
-}
-
-RANK_VALUES = {'IV': 0, 'III': 1, 'II': 2, 'I': 3}
-
-def load_players():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f).get('players', [])
-    return []
-
-def save_players(players):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump({'players': players}, f, ensure_ascii=False, indent=2)
-
-async def get_uuid(session, name, tag):
-    url = f'https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{name}/{tag}'
-    async with session.get(url, params={'api_key': RIOT_API_KEY}) as resp:
-        if resp.status == 200:
-            data = await resp.json()
-            return data.get('puuid')
-    return None
-
-async def get_league(session, uuid):
-    url = f'https://{REGION}.api.riotgames.com/tft/league/v1/by-puuid/{uuid}'
-    async with session.get(url, params={'api_key': RIOT_API_KEY}) as resp:
-        if resp.status == 200:
-            data = await resp.json()
-            for entry in data:
-                if entry['queueType'] == 'RANKED_TFT':
-                    return entry
-    return None
-
-async def get_match_ids(session, uuid, count=5):
-    url = f"https://europe.api.riotgames.com/tft/match/v1/matches/by-puuid/{uuid}/ids"
-    async with session.get(url, params={"api_key": RIOT_API_KEY, "count": count}) as resp:
-        if resp.status == 200:
-            return await resp.json()
-    return []
-
-async def get_match_data(session, match_id):
-    url = f"https://europe.api.riotgames.com/tft/match/v1/matches/{match_id}"
-    async with session.get(url, params={"api_key": RIOT_API_KEY}) as resp:
-        if resp.status == 200:
-            return await resp.json()
-    return None
-
-def get_default_font():
-    try:
-        import PIL
-        font_path = os.path.join(os.path.dirname(PIL.__file__), "Tests/fonts/FreeMono.ttf")
-        return ImageFont.truetype(font_path, 22)
-    except Exception:
-        return ImageFont.load_default()
-
 def get_icon_url(character_id: str) -> str:
-    return f"{CDRAGON_BASE}/{character_id.lower()}_square.tft_set16.png"
+    return (f"{CDRAGON_BASE}/game/assets/ux/tft/championsplashes/patching/"
+            f"{character_id.lower()}_square.tft_set{TFT_SET}.png")
+
+def parse_shard_ids(text):
+    """'0-3' -> [0, 1, 2, 3], '0,2,4' -> [0, 2, 4], '' -> None."""
+    ids = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            ids.extend(range(int(first), int(last) + 1))
+        else:
+            ids.append(int(part))
+    return ids or None
+
+def shard_file(path):
+    """
+    Fichier propre au process : les process de SHARD_IDS différents partagent
+    DATA_DIR, et ces fichiers sont réécrits en entier (savez, compactage) sans
+    verrou entre process. 'analytics.npz' -> 'analytics.shard-0_1.npz' ; inchangé
+    avec un seul process.
+    """
+    ids = parse_shard_ids(SHARD_IDS)
+    if not ids:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{'_'.join(map(str, ids))}{ext}"
+
+class TFTBot(commands.AutoShardedBot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Client Riot partagé (pool de connexions keep-alive) pour toute la durée de vie du bot
+        self.riot = RiotClient(RIOT_API_KEY, REGION, match_store=MatchStore(MATCH_DB_FILE),
+                               base_url=RIOT_BASE_URL)
+        # Joueurs suivis + cache de stats (SQLite)
+        self.storage = Storage(DB_FILE, players_json=DATA_FILE, stats_json=STATS_FILE)
+        self.players = PlayerRegistry(self.storage)
+        # Icônes de champions (LRU mémoire + disque)
+        self.icons = IconCache(self.riot, get_icon_url, ICON_CACHE_DIR)
+        self.renderer = Renderer(RENDER_POOL, RENDER_WORKERS)
+        self.render_cache = RenderCache(RENDER_CACHE_DIR)
+        self.atlas_task = None
+        # Table NumPy des parties ranked (cf. !meta)
+        self.analytics = CompAnalytics(shard_file(ANALYTICS_FILE), SET_PREFIX)
+        # Évolution des LP de chaque joueur (cf. !progress)
+        self.lp_history = LPHistory(shard_file(LP_HISTORY_FILE))
+        # Dernière league connue par puuid (partagée par tous les serveurs)
+        # + classement précalculé de chaque serveur (cf. league_poller)
+        self.leagues = {}
+        self.leaderboards = {}
+        self.leaderboard_lock = asyncio.Lock()
+        # puuid dont la dernière league n'a pas pu être rafraîchie (affichés en retard)
+        self.stale_leagues = set()
+        # Requêtes Riot qui ont dépassé le budget d'une commande et se terminent en fond
+        self.background_tasks = set()
+        # Mise à jour des compos en cours par puuid (partagée par les !stats qui se suivent)
+        self.comp_updates = {}
+        # Mesures de perf (cf. !perf) : jauges lues à l'affichage
+        self.perf_runner = None
+        metrics.gauge("riot_queue_depth", lambda: self.riot.queue_depth)
+        metrics.gauge("players_tracked", lambda: len(self.players))
+
+    async def setup_hook(self):
+        await self.riot.start()
+        await self.players.load()
+        # Dernières leagues connues (écrites par ce process ou un autre shard)
+        self.leagues.update(await self.storage.get_leagues([p['uuid'] for p in self.players.all()]))
+        await asyncio.to_thread(self.load_analytics)
+        await asyncio.to_thread(self.lp_history.load)
+        self.atlas_task = asyncio.create_task(self.load_atlas())
+        league_poller.start()
+        comp_ingester.start()
+        if PERF_PORT:
+            self.perf_runner = await metrics.serve(PERF_HOST, PERF_PORT)
+        if PERF_DUMP_FILE:
+            perf_dumper.start()
+        if SYNC_SLASH_COMMANDS and (self.shard_ids is None or 0 in self.shard_ids):
+            try:
+                await self.tree.sync()
+            except discord.HTTPException as e:
+                print(f"Synchronisation des commandes slash impossible : {e!r}")
+
+    def load_analytics(self):
+        # Premier lancement ou changement de set (TFT_SET) : on reconstruit la table depuis
+        # les matchs déjà stockés, en ne gardant que ceux du set courant
+        if not self.analytics.load():
+            for record in self.riot.match_store.iter_records():
+                self.analytics.add_match(record)
+            self.analytics.save()
+
+    async def load_atlas(self):
+        """Charge l'atlas du set, ou le construit une fois en tâche de fond s'il manque."""
+        png_path, index_path = atlas_paths(ATLAS_DIR, TFT_SET, self.icons.size)
+        atlas = await asyncio.to_thread(SpriteAtlas.load, png_path, index_path)
+        if atlas is None:
+            try:
+                atlas = await build_atlas(self.riot, get_icon_url, ATLAS_DIR, TFT_SET, self.icons.size,
+                                          data_url=CDRAGON_TFT_DATA)
+            except Exception as e:
+                print(f"Construction de l'atlas impossible : {e!r}")
+        self.icons.atlas = atlas
+
+    async def close(self):
+        league_poller.cancel()
+        comp_ingester.cancel()
+        perf_dumper.cancel()
+        if self.atlas_task is not None:
+            self.atlas_task.cancel()
+        for task in list(self.background_tasks):
+            task.cancel()
+        if self.perf_runner is not None:
+            await self.perf_runner.cleanup()
+        await super().close()
+        await self.riot.close()
+        self.riot.match_store.close()
+        self.storage.close()
+        self.renderer.close()
+
+    async def get_context(self, origin, /, *, cls=commands.Context):
+        ctx = await super().get_context(origin, cls=cls)
+        # Début de la commande (préfixe ou slash : les deux passent par ici), cf. _command_done
+        ctx.started_at = time.perf_counter()
+        return ctx
+
+    def _command_done(self, ctx, status):
+        # Durée de chaque commande, erreurs comprises. Les commandes slash ne passent pas par
+        # invoke() : mesurées sur les événements command_completion / command_error
+        started_at = getattr(ctx, 'started_at', None)
+        if ctx.command is None or started_at is None:
+            return
+        command = ctx.command.qualified_name
+        metrics.observe("command_seconds", time.perf_counter() - started_at, command=command)
+        metrics.inc("commands_total", command=command, status=status)
+
+    async def on_command_completion(self, ctx):
+        self._command_done(ctx, "ok")
+
+    def spawn(self, aw):
+        """Tâche de fond gardée jusqu'à sa fin (ex. revalidation après un budget dépassé)."""
+        task = asyncio.ensure_future(aw)
+        if task not in self.background_tasks:
+            self.background_tasks.add(task)
+            task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task):
+        self.background_tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None and not isinstance(error, RiotAPIError):
+            print(f"Tâche de fond en échec : {error!r}")
+
+    async def on_command_error(self, ctx, error):
+        self._command_done(ctx, "error")
+        # Riot saturé / en panne : on le dit au lieu de répondre "joueur introuvable".
+        # En slash, l'erreur est emballée deux fois (HybridCommandError > CommandInvokeError)
+        original = error
+        while getattr(original, 'original', None) is not None:
+            original = original.original
+        if isinstance(original, RiotAPIError):
+            await ctx.send("⏳ L'API Riot ne répond pas pour le moment (rate-limit ou panne). Réessaie dans quelques instants.")
+            return
+        if isinstance(error, commands.NoPrivateMessage):
+            await ctx.send("❌ Les classements sont propres à chaque serveur : utilise cette commande sur un serveur.")
+            return
+        await super().on_command_error(ctx, error)
+
+bot = TFTBot(command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=parse_shard_ids(SHARD_IDS))
+# Chaque serveur a son propre roster : pas de commandes en message privé
+# (les commandes hybrides ont en plus @commands.guild_only() pour ne pas être proposées en MP)
+bot.add_check(commands.guild_only().predicate)
+
+def parse_riot_id(text):
+    """
+    "Toto#EUW" ou "Toto#1234 NA" -> (pseudo, tag, plateforme), la région en fin
+    étant optionnelle (REGION par défaut). None si ce n'est pas un pseudo#tag.
+    """
+    text = text.strip()
+    platform = REGION
+    riot_id, _, region = text.rpartition(' ')
+    if '#' in riot_id and parse_platform(region):
+        text, platform = riot_id, parse_platform(region)
+    name, sep, tag = text.partition('#')
+    name, tag = name.strip(), tag.strip()
+    if not sep or not name or not tag:
+        return None
+    return name, tag, platform
+
+def served_guild_ids():
+    """Serveurs gérés par ce process (ses shards)."""
+    return [guild.id for guild in bot.guilds]
+
+async def fetch_new_match_ids(riot, puuid: str, last_match_id=None, limit: int = 60, page_size: int = 20,
+                              platform=None):
+    """
+    IDs des parties plus récentes que `last_match_id` (du plus récent au plus ancien),
+    en paginant avec `start` : on s'arrête dès qu'on retombe sur une partie déjà traitée.
+    """
+    new_ids = []
+    start = 0
+    while len(new_ids) < limit:
+        page = await riot.get_match_ids(puuid, page_size, start=start, platform=platform, priority=PRIORITY_BACKGROUND)
+        for mid in page:
+            if mid == last_match_id:
+                return new_ids
+            new_ids.append(mid)
+        if len(page) < page_size:
+            break
+        start += page_size
+    return new_ids[:limit]
+
+def _add_match(comp_stats, match, puuid: str):
+    """Ajoute une partie (si ranked du set courant) aux agrégats de compos."""
+    if match.queue_id != 1100:
+        return
+
+    # On récupère le participant correspondant
+    participant = match.participant(puuid)
+    if not participant:
+        return
 
-def load_stats():
-    if os.path.exists(STATS_FILE):
-        with open(STATS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    # Trait "principal", set courant uniquement
+    comp_name = main_comp(participant, SET_PREFIX)
+    if comp_name is None:
+        return
+    placement = participant.placement
 
-def save_stats(stats):
-    with open(STATS_FILE, "w", encoding="utf-8") as f:
-        json.dump(stats, f, ensure_ascii=False, indent=2)
+    stats = comp_stats.setdefault(
+        comp_name,
+        {"games": 0, "wins": 0, "placement_sum": 0, "placement_hist": [0] * 8}
+    )
+    stats["games"] += 1
+    stats["placement_sum"] += placement
+    if 1 <= placement <= 8:
+        stats["placement_hist"][placement - 1] += 1
 
-def _pretty_trait_name(trait_name: str) -> str:
-    # "TFT16_Demacia" -> "Demacia"
-    return trait_name.split("_")[-1].title()
+    if 1 <= placement <= 4:  # Top 1–4 = win
+        stats["wins"] += 1
 
-async def analyze_comps(session, puuid: str, count: int = 60):
+async def analyze_comps(riot, puuid: str, cached=None, count: int = 60, platform=None, analytics=None):
     """
-    Analyse les dernières parties du joueur (set 16 uniquement) et renvoie :
+    Met à jour les stats de compos du joueur (set courant, TFT_SET, uniquement) de façon incrémentale
+    et renvoie (comp_stats, last_match_id) :
     {
-      "Compo": {"games": x, "wins": y, "placements": [...]},
+      "Compo": {"games": x, "wins": y, "placement_sum": s, "placement_hist": [top1, ..., top8]},
       ...
     }
-    On parallélise les appels à get_match_data pour accélérer.
+    Seules les parties plus récentes que cached["last_match_id"] sont récupérées
+    (au plus `count`), puis ajoutées aux agrégats existants, et à `analytics`
+    (CompAnalytics) s'il est donné.
     """
-    comp_stats = {}
+    cached = cached or {}
+    comp_stats = cached.get("comps", {})
+    last_match_id = cached.get("last_match_id")
 
-    match_ids = await get_match_ids(session, puuid, count)
+    match_ids = await fetch_new_match_ids(riot, puuid, last_match_id, limit=count, platform=platform)
     if not match_ids:
-        return comp_stats
+        return comp_stats, last_match_id
 
-    # Limite de concurrence pour respecter le rate-limit Riot
-    semaphore = asyncio.Semaphore(5)
+    # On récupère les infos de match en parallèle : le rate-limit est géré par
+    # le limiteur du client, en priorité basse pour ne pas bloquer les commandes
+    results = await asyncio.gather(
+        *(riot.get_match_data(mid, priority=PRIORITY_BACKGROUND) for mid in match_ids),
+        return_exceptions=True
+    )
 
-    async def fetch_match(mid):
-        async with semaphore:
-            try:
-                return await get_match_data(session, mid)
-            except Exception:
-                return None
+    for data in results:
+        if isinstance(data, Exception):
+            raise data
+        if data:
+            _add_match(comp_stats, data, puuid)
+            if analytics is not None:
+                analytics.add_match(data)
+
+    return comp_stats, match_ids[0]
+
+async def load_comp_cache(puuid: str):
+    """Cache de compos du joueur, None si absent ou à l'ancien format (liste "placements" sans high-water mark)."""
+    cached = await bot.storage.get_stats(puuid)
+    if cached and "last_match_id" not in cached:
+        return None
+    return cached
+
+async def save_comp_cache(player, comp_stats, last_match_id):
+    await bot.storage.save_stats(player["uuid"], {
+        "name": player["name"],
+        "region": player["platform"],
+        "comps": comp_stats,
+        "last_match_id": last_match_id,
+    })
+
+async def ingest_roster(count: int = 60, guild_ids=None):
+    """
+    Met à jour les compos de tous les joueurs suivis (par les serveurs de ce shard
+    par défaut) en une passe. Les nouveaux matchs de chacun sont regroupés et
+    dédupliqués (les potes qui jouent ensemble partagent le même lobby) : chaque
+    match est récupéré une seule fois, puis ajouté à tous les joueurs suivis
+    présents dans la partie. Un joueur suivi sur plusieurs serveurs n'est traité qu'une fois.
+    Les IDs sont repris depuis le high-water mark de bot.analytics (propre à ce
+    process), qui ne dépasse jamais celui des stats de compos (partagé) : les
+    matchs qu'un autre shard a déjà comptés dans les stats ne vont qu'à analytics
+    (et sont en général déjà dans le match store).
+    Renvoie le nombre de matchs distincts traités.
+    """
+    players = bot.players.all(served_guild_ids() if guild_ids is None else guild_ids)
+    caches = await asyncio.gather(*(load_comp_cache(p["uuid"]) for p in players))
+    new_ids = await asyncio.gather(*(
+        fetch_new_match_ids(bot.riot, p["uuid"], bot.analytics.last_match_id(p["uuid"]), limit=count,
+                            platform=p["platform"])
+        for p in players
+    ), return_exceptions=True)
+    # Historique d'un joueur indisponible : il garde son high-water mark et sera repris
+    # au prochain passage, sans empêcher la mise à jour des autres
+    for i, ids in enumerate(new_ids):
+        if isinstance(ids, RiotAPIError):
+            new_ids[i] = []
+        elif isinstance(ids, Exception):
+            raise ids
+
+    # Par joueur : les matchs plus récents que le high-water mark de ses stats de compos
+    pending = {}
+    for p, c, ids in zip(players, caches, new_ids):
+        last_match_id = (c or {}).get("last_match_id")
+        pending[p["uuid"]] = set(ids[:ids.index(last_match_id)] if last_match_id in ids else ids)
+    comp_stats = {p["uuid"]: (c or {}).get("comps", {}) for p, c in zip(players, caches)}
+    unique_ids = list(dict.fromkeys(mid for ids in new_ids for mid in ids))
 
-    # On récupère les infos de match en parallèle
     results = await asyncio.gather(
-        *(fetch_match(mid) for mid in match_ids),
-        return_exceptions=False
+        *(bot.riot.get_match_data(mid, priority=PRIORITY_BACKGROUND) for mid in unique_ids),
+        return_exceptions=True
     )
 
-    for data in results:
-        if not data:
+    failed = set()
+    for match_id, match in zip(unique_ids, results):
+        if isinstance(match, RiotAPIError):
+            failed.add(match_id)
+            continue
+        if isinstance(match, Exception):
+            raise match
+        if not match:
             continue
+        bot.analytics.add_match(match)
+        # Un seul téléchargement, réparti sur chaque joueur suivi du lobby
+        for participant in match.participants:
+            if match_id in pending.get(participant.puuid, ()):
+                _add_match(comp_stats[participant.puuid], match, participant.puuid)
+
+    for p, ids in zip(players, new_ids):
+        # Un match manquant : on n'avance pas le high-water mark, il sera repris au prochain passage
+        if pending[p["uuid"]] and not (pending[p["uuid"]] & failed):
+            await save_comp_cache(p, comp_stats[p["uuid"]], ids[0])
+        if ids and not failed.intersection(ids):
+            bot.analytics.set_last_match_id(p["uuid"], ids[0])
+    await asyncio.to_thread(bot.analytics.save)
+    return len(unique_ids)
+
+async def within_budget(aw, budget=COMMAND_BUDGET_SECONDS):
+    """
+    Attend `aw` au plus `budget` secondes. Renvoie (résultat, True) s'il arrive à
+    temps, sinon (None, False) et la requête continue en fond : son résultat
+    alimentera les caches (stale-while-revalidate). Riot en erreur compte comme un retard.
+    """
+    task = asyncio.ensure_future(aw)
+    done, _ = await asyncio.wait({task}, timeout=budget)
+    if not done:
+        bot.spawn(task)
+        return None, False
+    if isinstance(task.exception(), RiotAPIError):
+        return None, False
+    return task.result(), True
+
+async def fetch_league(player, priority=PRIORITY_INTERACTIVE):
+    """League du joueur depuis Riot, gardée dans bot.leagues (et retirée des joueurs en retard)."""
+    try:
+        league = await bot.riot.get_league(player['uuid'], player['platform'], priority=priority)
+    except RiotAPIError:
+        # Riot indisponible pour ce joueur : on garde la dernière valeur connue, marquée en retard
+        bot.stale_leagues.add(player['uuid'])
+        raise
+    bot.leagues[player['uuid']] = league
+    bot.stale_leagues.discard(player['uuid'])
+    return league
+
+async def league_within_budget(player):
+    """
+    (league, à jour) du joueur dans le budget de latence ; sinon sa dernière league
+    connue (à jour = False), revalidée en fond. RiotAPIError si on n'en connaît aucune.
+    """
+    league, fresh = await within_budget(fetch_league(player))
+    if fresh:
+        return league, True
+    if player['uuid'] not in bot.leagues:
+        raise RiotAPIError('deadline', f"league-by-puuid {player['name']}")
+    bot.stale_leagues.add(player['uuid'])
+    return bot.leagues[player['uuid']], False
+
+async def match_ids_within_budget(player, count):
+    """(IDs des derniers matchs, à jour) : à défaut d'une réponse dans le budget, les derniers reçus."""
+    match_ids, fresh = await within_budget(
+        bot.riot.get_match_ids(player['uuid'], count, platform=player['platform'])
+    )
+    if fresh:
+        return match_ids, True
+    match_ids = bot.riot.last_match_ids(player['uuid'], count)
+    if not match_ids:
+        raise RiotAPIError('deadline', f"match-ids-by-puuid {player['name']}")
+    return match_ids, False
+
+async def prefetch_matches(match_ids):
+    """Récupère des matchs en fond : ils seront dans le MatchStore à la prochaine commande."""
+    await asyncio.gather(
+        *(bot.riot.get_match_data(mid, priority=PRIORITY_BACKGROUND) for mid in match_ids),
+        return_exceptions=True
+    )
 
-        info = data.get("info", {})
+async def iter_matches_within(match_ids, budget=COMMAND_BUDGET_SECONDS):
+    """
+    Comme RiotClient.iter_matches (dans l'ordre, quelques requêtes en avance), mais
+    s'arrête au bout de `budget` secondes : les matchs pas encore reçus sont alors
+    récupérés en fond. À utiliser avec contextlib.aclosing.
+    """
+    deadline = time.monotonic() + budget
+    seen = set()
+    async with aclosing(bot.riot.iter_matches(match_ids)) as results:
+        while True:
+            try:
+                match_id, data = await asyncio.wait_for(anext(results), max(0, deadline - time.monotonic()))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                bot.spawn(prefetch_matches([mid for mid in match_ids if mid not in seen]))
+                return
+            seen.add(match_id)
+            yield match_id, data
+
+async def resolve_riot_ids(entries, priority=PRIORITY_INTERACTIVE):
+    """
+    Résout des (pseudo, tag, plateforme) en puuid : d'abord les Riot ID déjà connus
+    (SQLite), puis tous les autres en parallèle, au rythme du limiteur.
+    Renvoie ({riot_id_key: puuid ou None si introuvable}, {riot_id_key: RiotAPIError}).
+    """
+    wanted = {riot_id_key(name, tag): (name, tag, platform) for name, tag, platform in entries}
+    resolved = await bot.storage.get_riot_ids(wanted, max_age=RIOT_ID_TTL_DAYS * 86400)
+    missing = [key for key in wanted if key not in resolved]
+    metrics.inc('cache_requests_total', len(resolved), cache='riot_id', result='hit')
+    metrics.inc('cache_requests_total', len(missing), cache='riot_id', result='miss')
 
-        if info.get("queue_id") != 1100:
+    results = await asyncio.gather(
+        *(bot.riot.get_uuid(*wanted[key], priority=priority) for key in missing),
+        return_exceptions=True
+    )
+    failed, found = {}, {}
+    for key, puuid in zip(missing, results):
+        if isinstance(puuid, RiotAPIError):
+            failed[key] = puuid
             continue
+        if isinstance(puuid, Exception):
+            raise puuid
+        resolved[key] = puuid
+        if puuid:
+            found[key] = puuid
+    if found:
+        await bot.storage.save_riot_ids(found)
+    return resolved, failed
+
+def _build_leaderboard(guild_id, updated_at=None):
+    roster = bot.players.roster(guild_id)
+    # Joueurs dont Riot n'a encore renvoyé aucune league : à part, pas dans les "non rankés"
+    return Leaderboard(
+        [(p['name'], bot.leagues[p['uuid']]) for p in roster if p['uuid'] in bot.leagues],
+        updated_at=updated_at,
+        stale=[p['name'] for p in roster if p['uuid'] in bot.stale_leagues and p['uuid'] in bot.leagues],
+        pending=[p['name'] for p in roster if p['uuid'] not in bot.leagues],
+    )
 
-        # On récupère le participant correspondant
-        participant = None
-        for p in info.get("participants", []):
-            if p.get("puuid") == puuid:
-                participant = p
+async def refresh_leaderboard(guild_ids=None, priority=PRIORITY_BACKGROUND, on_progress=None, budget=None):
+    """
+    Récupère la league des joueurs suivis (par les serveurs de ce shard par défaut)
+    et recalcule le classement de chaque serveur. Un puuid suivi sur plusieurs
+    serveurs n'est demandé qu'une fois, et pas du tout si un autre shard vient de
+    le rafraîchir (leagues partagées via Storage).
+    Chaque plateforme a son propre limiteur : les régions avancent en parallèle.
+    `on_progress(reçues, total)` est attendu au fil des réponses (au plus toutes
+    les PROGRESS_EDIT_SECONDS) : bot.leagues est déjà à jour.
+    Avec un `budget` (secondes, pour une commande), les joueurs sans réponse à temps
+    gardent leur dernière league connue, marquée en retard, et la fin du
+    rafraîchissement continue en fond ; si le poller est déjà en train de
+    rafraîchir, on n'attend pas : classement des dernières valeurs connues.
+    Renvoie {guild_id: Leaderboard}.
+    """
+    if guild_ids is None:
+        guild_ids = served_guild_ids()
+    if budget is not None and bot.leaderboard_lock.locked():
+        return {guild_id: bot.leaderboards.get(guild_id) or _build_leaderboard(guild_id) for guild_id in guild_ids}
+    deadline = None if budget is None else time.monotonic() + budget
+    async with bot.leaderboard_lock:
+        players = bot.players.all(guild_ids)
+        fresh = await bot.storage.get_leagues([p['uuid'] for p in players], max_age=LEAGUE_REFRESH_SECONDS / 2)
+        bot.leagues.update(fresh)
+        bot.stale_leagues.difference_update(fresh)
+        stale = [p for p in players if p['uuid'] not in fresh]
+
+        # Traitées dans l'ordre d'arrivée, pour pouvoir afficher le classement au fur et à mesure
+        lookups = {asyncio.ensure_future(fetch_league(p, priority)): p for p in stale}
+        fetched = {}
+        received = len(players) - len(stale)
+        last_progress = time.monotonic()
+        pending = set(lookups)
+        while pending:
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
                 break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                received += 1
+                if isinstance(task.exception(), RiotAPIError):
+                    continue  # dernière valeur connue gardée, marquée en retard par fetch_league
+                fetched[lookups[task]['uuid']] = task.result()
+            if on_progress is not None and pending and time.monotonic() - last_progress >= PROGRESS_EDIT_SECONDS:
+                await on_progress(received, len(players))
+                last_progress = time.monotonic()
+        if pending:
+            # Budget dépassé : les réponses en retard seront enregistrées en fond
+            bot.stale_leagues.update(lookups[task]['uuid'] for task in pending)
+            bot.spawn(revalidate_leagues({task: lookups[task] for task in pending}, guild_ids))
+        if fetched:
+            await bot.storage.save_leagues(fetched)
+        # Leagues rafraîchies par un autre shard comprises : chaque process a son propre
+        # historique (cf. shard_file), et record_lp n'écrit que ce qui a changé
+        if fresh or fetched:
+            await asyncio.to_thread(record_lp, {**fresh, **fetched})
+        for guild_id in guild_ids:
+            bot.leaderboards[guild_id] = _build_leaderboard(guild_id)
+        return {guild_id: bot.leaderboards[guild_id] for guild_id in guild_ids}
+
+async def revalidate_leagues(lookups, guild_ids):
+    """Fin d'un rafraîchissement hors budget : enregistre les leagues arrivées en retard et recalcule les classements."""
+    done, _ = await asyncio.wait(lookups)
+    fetched = {lookups[task]['uuid']: task.result() for task in done if task.exception() is None}
+    if fetched:
+        await bot.storage.save_leagues(fetched)
+        await asyncio.to_thread(record_lp, fetched)
+    for guild_id in guild_ids:
+        await rebuild_leaderboard(guild_id)
+
+def record_lp(leagues):
+    """Ajoute les leagues reçues à l'historique des LP (seulement ce qui a changé), puis compacte de temps en temps."""
+    bot.lp_history.append([
+        (puuid, get_score(league), league['wins'], league['losses'])
+        for puuid, league in leagues.items() if league
+    ])
+    bot.lp_history.maybe_compact()
+
+async def rebuild_leaderboard(guild_id):
+    """Recalcule le classement d'un serveur depuis les leagues déjà connues, sans appel Riot."""
+    leaderboard = bot.leaderboards.get(guild_id)
+    if leaderboard is None:
+        return
+    bot.leaderboards[guild_id] = _build_leaderboard(guild_id, updated_at=leaderboard.updated_at)
 
-        if not participant:
-            continue
+async def send_leaderboard(ctx, build_embed, empty_message):
+    """
+    Envoie l'embed `build_embed(leaderboard, progress)` du classement du serveur.
+    Si le poller ne l'a pas encore calculé, le message part tout de suite avec les
+    leagues déjà connues, puis il est édité au fil des réponses Riot
+    (progress = (reçues, total)) jusqu'au classement final (progress = None).
+    build_embed renvoie None quand il n'y a rien à afficher : on envoie alors empty_message.
+    """
+    guild_id = ctx.guild.id
+    leaderboard = bot.leaderboards.get(guild_id)
+    if leaderboard is not None:
+        embed = build_embed(leaderboard, None)
+        return await ctx.send(embed=embed) if embed else await ctx.send(empty_message)
+
+    roster = bot.players.roster(guild_id)
+    # Les joueurs dont on ne connaît pas encore la league sont "en attente" (cf. _build_leaderboard)
+    known = sum(p['uuid'] in bot.leagues for p in roster)
+    message = await ctx.send(embed=build_embed(_build_leaderboard(guild_id), (known, len(roster))))
+
+    async def progress(received, total):
+        try:
+            await message.edit(embed=build_embed(_build_leaderboard(guild_id), (received, total)))
+        except discord.HTTPException:
+            pass  # une étape sautée : la suivante (ou la finale) la remplace
 
-        placement = participant.get("placement")
-        traits = participant.get("traits", [])
-        if placement is None or not traits:
-            continue
+    leaderboard = (await refresh_leaderboard([guild_id], PRIORITY_INTERACTIVE, progress,
+                                             budget=COMMAND_BUDGET_SECONDS))[guild_id]
+    embed = build_embed(leaderboard, None)
+    await message.edit(content=None if embed else empty_message, embed=embed)
 
-        # --------- FILTRE SET 16 UNIQUEMENT ----------
-        if not any(t.get("name", "").startswith("TFT16_") for t in traits):
-            continue
+def _progress_text(progress) -> str:
+    received, total = progress
+    return f"⏳ Mise à jour en cours… ({received}/{total} joueurs)"
 
-        # Trait "principal" : plus haut tier_current puis num_units
-        main_trait = max(
-            traits,
-            key=lambda t: (t.get("tier_current", 0), t.get("num_units", 0))
-        )
-        comp_name = _pretty_trait_name(main_trait.get("name", "Unknown"))
+def _stale_note(leaderboard) -> str:
+    """Légende du footer quand des joueurs sont affichés avec une league en retard."""
+    return f" | {STALE_MARK} = dernière valeur connue" if leaderboard.stale else ""
 
-        stats = comp_stats.setdefault(
-            comp_name,
-            {"games": 0, "wins": 0, "placements": []}
-        )
-        stats["games"] += 1
-        stats["placements"].append(placement)
+@tasks.loop(seconds=LEAGUE_REFRESH_SECONDS)
+async def league_poller():
+    try:
+        await refresh_leaderboard()
+    except Exception as e:
+        print(f"Rafraîchissement du classement impossible : {e!r}")
 
-        if 1 <= placement <= 4:  # Top 1–4 = win
-            stats["wins"] += 1
+@league_poller.before_loop
+async def before_league_poller():
+    await bot.wait_until_ready()
 
-    return comp_stats
+@tasks.loop(seconds=INGEST_REFRESH_SECONDS)
+async def comp_ingester():
+    try:
+        await ingest_roster()
+    except Exception as e:
+        print(f"Mise à jour des compos impossible : {e!r}")
+
+@comp_ingester.before_loop
+async def before_comp_ingester():
+    await bot.wait_until_ready()
+
+@tasks.loop(seconds=PERF_DUMP_SECONDS)
+async def perf_dumper():
+    # Export construit sur la boucle (jauges du limiteur), seul le fichier est écrit dans un thread.
+    # Toute erreur est journalisée : une exception non rattrapée arrêterait la tâche
+    try:
+        await asyncio.to_thread(metrics.dump, PERF_DUMP_FILE, metrics.prometheus())
+    except Exception as e:
+        print(f"Export des mesures de perf impossible : {e!r}")
 
 def _winrate(stats_dict) -> float:
     g = stats_dict["games"]
@@ -183,144 +728,294 @@ def _winrate(stats_dict) -> float:
 
 
 def _avg_placement(stats_dict) -> float:
-    pl = stats_dict["placements"]
-    if not pl:
+    g = stats_dict["games"]
+    if g == 0:
         return 0.0
-    return round(sum(pl) / len(pl), 2)
+    return round(stats_dict["placement_sum"] / g, 2)
 
 @bot.event
 async def on_ready():
-    print(f'{bot.user} connecté ! Utilise !add <pseudo> pour commencer.')
+    print(f'{bot.user} connecté ({len(bot.guilds)} serveurs, shards {sorted(bot.shards)}) ! '
+          f'Utilise !add <pseudo> pour commencer.')
+    # Ancien roster global (avant les rosters par serveur) : rattaché à son serveur, par le
+    # seul process qui le sert. Le "seul serveur du bot" n'a de sens qu'avec un seul process :
+    # un shard qui ne sert qu'un serveur ne voit pas ceux des autres
+    if not bot.players.roster(LEGACY_GUILD):
+        return
+    target = LEGACY_GUILD_ID
+    if not target and not parse_shard_ids(SHARD_IDS) and len(bot.guilds) == 1:
+        target = bot.guilds[0].id
+    if not target:
+        if parse_shard_ids(SHARD_IDS):
+            print("Ancien roster global non rattaché : définir LEGACY_GUILD_ID (obligatoire avec SHARD_IDS).")
+        return
+    if bot.get_guild(target) is not None:
+        await bot.players.move_guild(LEGACY_GUILD, target)
+        print(f"Ancien roster rattaché au serveur {target}.")
 
 @bot.command()
 async def add(ctx, *, nameAndTag: str):
-    name = nameAndTag.split('#')[0].strip();
-    tag = nameAndTag.split('#')[1].strip();
-    
-    players = load_players()
-    if any(p['name'].lower() == name.lower() for p in players):
+    # Région optionnelle en fin de commande : "!add Toto#1234 NA" (EUW par défaut)
+    parsed = parse_riot_id(nameAndTag)
+    if parsed is None:
+        await ctx.send("❌ Format attendu : `!add pseudo#tag [région]`, par exemple `!add Toto#EUW`.")
+        return
+    name, tag, platform = parsed
+
+    if bot.players.find(ctx.guild.id, name):
         await ctx.send(f"❌ **{name}** est déjà dans le classement.")
         return
 
-    async with aiohttp.ClientSession() as session:
-        uuid = await get_uuid(session, name, tag)
-        if not uuid:
-            await ctx.send(f"❌ **{name}** non trouvé sur {REGION.upper()}. Vérifie le pseudo/région.")
-            return
+    resolved, failed = await resolve_riot_ids([parsed])
+    key = riot_id_key(name, tag)
+    if key in failed:
+        raise failed[key]
+    uuid = resolved.get(key)
+    if not uuid:
+        await ctx.send(f"❌ **{name}** non trouvé sur {platform_label(platform)}. Vérifie le pseudo/région.")
+        return
+    if bot.players.tracks(ctx.guild.id, uuid):
+        await ctx.send(f"❌ Ce compte est déjà dans le classement (**{bot.players.entry(ctx.guild.id, uuid)['name']}**).")
+        return
 
-    players.append({'name': name, 'uuid': uuid})
-    save_players(players)
+    await bot.players.add(ctx.guild.id, name, uuid, platform)
+    # Sans réponse dans le budget, la league arrive en fond (ou au prochain passage du poller)
+    await within_budget(fetch_league({'name': name, 'uuid': uuid, 'platform': platform}))
+    await rebuild_leaderboard(ctx.guild.id)
     await ctx.send(f"✅ **{name}** ajouté au classement !")
 
+def _names_field(names, limit=1024) -> str:
+    """Pseudos séparés par " | ", tronqués pour tenir dans un champ d'embed."""
+    text = ""
+    for i, name in enumerate(names):
+        part = name if not text else f" | {name}"
+        if len(text) + len(part) > limit - 12:
+            return f"{text} … (+{len(names) - i})"
+        text += part
+    return text
+
+@bot.command(aliases=['addall'])
+async def addmany(ctx, *, entries: str = ""):
+    # Un "pseudo#tag [région]" par ligne (ou séparés par , ou ;), dans le message et/ou un fichier joint
+    text = entries
+    for attachment in ctx.message.attachments:
+        if attachment.size > MAX_BULK_FILE_BYTES:
+            return await ctx.send(f"❌ **{attachment.filename}** est trop gros (max {MAX_BULK_FILE_BYTES // 1024} Ko).")
+        text += "\n" + (await attachment.read()).decode("utf-8", errors="replace")
+
+    segments = [seg.strip() for seg in re.split(r'[\n,;]+', text) if seg.strip()]
+    if not segments:
+        return await ctx.send("❌ Utilisation : `!addmany Toto#EUW, Titi#1234 NA, ...` (ou un fichier .txt joint, un joueur par ligne).")
+    if len(segments) > MAX_BULK_PLAYERS:
+        return await ctx.send(f"❌ {len(segments)} joueurs : {MAX_BULK_PLAYERS} maximum par import.")
+
+    # Doublons de saisie retirés avant tout appel (même Riot ID, casse comprise)
+    parsed, invalid = {}, []
+    for seg in segments:
+        entry = parse_riot_id(seg)
+        if entry is None:
+            invalid.append(seg)
+            continue
+        parsed.setdefault(riot_id_key(entry[0], entry[1]), entry)
+
+    # Résolution en parallèle, en priorité basse : les commandes des autres passent avant
+    async with ctx.typing():
+        resolved, failed = await resolve_riot_ids(parsed.values(), priority=PRIORITY_BACKGROUND)
+
+    guild_id = ctx.guild.id
+    new_players, taken_names = {}, set()
+    already, conflicts, not_found = [], [], []
+    for key, (name, tag, platform) in parsed.items():
+        if key in failed:
+            continue
+        uuid = resolved.get(key)
+        if not uuid:
+            not_found.append(f"{name}#{tag}")
+        elif bot.players.tracks(guild_id, uuid) or uuid in new_players:
+            # Dédupliqué par compte, pas par pseudo
+            already.append(name)
+        elif bot.players.find(guild_id, name) or name_key(name) in taken_names:
+            conflicts.append(name)
+        else:
+            new_players[uuid] = {'name': name, 'uuid': uuid, 'platform': platform}
+            taken_names.add(name_key(name))
+
+    # Une seule écriture pour tout l'import, puis leagues récupérées en fond
+    added = await bot.players.add_many(guild_id, list(new_players.values()))
+    if added:
+        await rebuild_leaderboard(guild_id)
+        lookups = {asyncio.ensure_future(fetch_league(p, PRIORITY_BACKGROUND)): p for p in added}
+        bot.spawn(revalidate_leagues(lookups, [guild_id]))
+
+    embed = discord.Embed(title="📥 Import de joueurs", color=0x2ecc71 if added else 0xe67e22)
+    sections = [
+        ("✅ Ajoutés", [p['name'] for p in added]),
+        ("🔁 Déjà suivis", already),
+        ("⚠️ Pseudo déjà pris sur ce serveur", conflicts),
+        ("❌ Introuvables", not_found),
+        ("⏳ API Riot indisponible, à réessayer", [f"{parsed[key][0]}#{parsed[key][1]}" for key in failed]),
+        ("❓ Format invalide (pseudo#tag attendu)", invalid),
+    ]
+    for title, names in sections:
+        if names:
+            embed.add_field(name=f"{title} ({len(names)})", value=_names_field(names), inline=False)
+    await ctx.send(embed=embed)
+
 @bot.command(aliases=['supp', 'del'])
 async def remove(ctx, *, name: str):
-    players = load_players()
-    old_len = len(players)
-    players = [p for p in players if p['name'].lower() != name.lower()]
-    if len(players) == old_len:
+    if not await bot.players.remove(ctx.guild.id, name):
         await ctx.send(f"❌ **{name}** n'est pas dans le classement.")
         return
-    save_players(players)
+    await rebuild_leaderboard(ctx.guild.id)
     await ctx.send(f"✅ **{name}** retiré du classement.")
 
 @bot.command()
 async def removeAll(ctx, *, name: str):
-    players = []
-    save_players(players)
+    await bot.players.clear(ctx.guild.id)
+    await rebuild_leaderboard(ctx.guild.id)
     await ctx.send(f"💀 Le classement a été totalement supprimé.")
 
-@bot.command(aliases=['lb', 'rank'])
+@bot.hybrid_command(aliases=['lb', 'rank'], description="Classement TFT des joueurs suivis")
+@commands.guild_only()
 async def classement(ctx):
-    players = load_players()
+    players = bot.players.roster(ctx.guild.id)
     if not players:
         await ctx.send("❌ Aucun joueur dans le classement. Utilise `!add <pseudo>`.")
         return
 
-    player_stats = []
-    async with aiohttp.ClientSession() as session:
-        for p in players:
-            league = await get_league(session, p['uuid'])
-            player_stats.append((p['name'], league))
-
-    # Stats valides (ranked TFT)
-    valid_stats = [(name, league) for name, league in player_stats if league]
-    if not valid_stats:
-        await ctx.send("❌ Aucun joueur ranké dans le classement.")
-        return
-
-    # Tri par score
-    def get_score(league):
-        tier = league['tier']
-        lp = league['leaguePoints']
-        div = league['rank']
-        return TIER_VALUES.get(tier, 0) * 1000 + RANK_VALUES.get(div, 0) * 100 + lp
-
-    valid_stats.sort(key=lambda x: get_score(x[1]), reverse=True)
+    # Slash : réponse différée tout de suite (sinon Discord abandonne au bout de 3 s)
+    await ctx.defer()
+    regions = ", ".join(sorted({platform_label(p['platform']) for p in players}))
 
-    # Embed
-    embed = discord.Embed(title="🏆 Classement TFT (Live)", color=0x00ff00, timestamp=ctx.message.created_at)
-    desc = ""
-    for i, (name, league) in enumerate(valid_stats[:10], 1):
-        tier = league['tier']
-        rank_div = league['rank']
-        lp = league['leaguePoints']
-        wins = league['wins']
-        losses = league['losses']
-        games = wins + losses
-        wr = round((wins / games * 100), 1) if games else 0
-        desc += f"{i}. **{name}** | {tier} {rank_div} **({lp} LP)** | {wr}% ({games} games)\n"
-
-    embed.description = desc
-
-    # Non rankés
-    unranked = [name for name, league in player_stats if not league]
-    if unranked:
-        embed.add_field(name="⚪ Non rankés", value=" | ".join(unranked), inline=False)
+    def build_embed(leaderboard, progress):
+        # Classement déjà trié (stats valides = ranked TFT)
+        valid_stats = leaderboard.ranked
+        if not valid_stats and progress is None:
+            return None
 
-    embed.set_footer(text=f"Région: {REGION.upper()} | {len(valid_stats)} rankés")
-    await ctx.send(embed=embed)
+        embed = discord.Embed(title="🏆 Classement TFT (Live)", color=0x00ff00, timestamp=ctx.message.created_at)
+        desc = ""
+        for i, (name, league) in enumerate(valid_stats[:10], 1):
+            tier = league['tier']
+            rank_div = league['rank']
+            lp = league['leaguePoints']
+            wins = league['wins']
+            losses = league['losses']
+            games = wins + losses
+            wr = round((wins / games * 100), 1) if games else 0
+            mark = f" {STALE_MARK}" if name in leaderboard.stale else ""
+            desc += f"{i}. **{name}**{mark} | {tier} {rank_div} **({lp} LP)** | {wr}% ({games} games)\n"
+        if progress is not None:
+            desc += f"\n{_progress_text(progress)}"
+
+        embed.description = desc
+
+        # Non rankés
+        unranked = leaderboard.unranked
+        if unranked:
+            embed.add_field(name="⚪ Non rankés", value=" | ".join(unranked), inline=False)
+        if leaderboard.pending and progress is None:
+            embed.add_field(name=f"{STALE_MARK} En attente de Riot", value=" | ".join(leaderboard.pending), inline=False)
+
+        updated = "mise à jour en cours" if progress is not None else f"Données {format_age(leaderboard.age)}"
+        embed.set_footer(text=f"Région: {regions} | {len(valid_stats)} rankés | {updated}{_stale_note(leaderboard)}")
+        return embed
+
+    await send_leaderboard(ctx, build_embed, "❌ Aucun joueur ranké dans le classement.")
 
 @bot.command()
 async def liste(ctx):
-    players = load_players()
+    players = bot.players.roster(ctx.guild.id)
     if not players:
         await ctx.send("Aucun joueur.")
         return
     names = [p['name'] for p in players]
     await ctx.send(f"👥 Joueurs suivis ({len(names)}): {' | '.join(names)}")
 
-@bot.command()
-async def stats(ctx, *, name: str):
-    players = load_players()
+def _comp_summary(comp_stats) -> str:
+    """Bloc "Data compos" de !stats : compo la plus jouée, meilleure et pire."""
+    if not comp_stats:
+        return f"Pas assez de données récentes (set {TFT_SET}) pour analyser les compositions."
+
+    # compo la plus jouée
+    most_played_name, most_played = max(
+        comp_stats.items(),
+        key=lambda item: item[1]["games"]
+    )
+
+    MIN_GAMES_FOR_WR = 3
+    eligible = {
+        n: s for n, s in comp_stats.items()
+        if s["games"] >= MIN_GAMES_FOR_WR
+    } or comp_stats
+
+    best_name, best_stats = max(
+        eligible.items(),
+        key=lambda item: _winrate(item[1])
+    )
+    worst_name, worst_stats = min(
+        eligible.items(),
+        key=lambda item: _winrate(item[1])
+    )
 
+    most_avg = _avg_placement(most_played)
+    best_avg = _avg_placement(best_stats)
+    worst_avg = _avg_placement(worst_stats)
+
+    most_wr = _winrate(most_played)
+    best_wr = _winrate(best_stats)
+    worst_wr = _winrate(worst_stats)
+
+    return (
+        f"**Compo la plus jouée :** {most_played_name} "
+        f"({most_played['games']} games) : AVG --> {most_avg} ({most_wr}% WR)\n"
+        f"**Meilleure compo :** {best_name} "
+        f"({best_stats['games']} games) : AVG --> {best_avg} ({best_wr}% WR)\n"
+        f"**Pire compo :** {worst_name} "
+        f"({worst_stats['games']} games) : AVG --> {worst_avg} ({worst_wr}% WR)"
+    )
+
+@bot.hybrid_command(description="Rang et compos d'un joueur suivi")
+@commands.guild_only()
+@app_commands.describe(name="Pseudo du joueur")
+async def stats(ctx, *, name: str):
     # Vérifier si le joueur est dans la liste
-    player = next((p for p in players if p['name'].lower() == name.lower()), None)
+    player = bot.players.find(ctx.guild.id, name)
     if not player:
         await ctx.send(f"❌ **{name}** n'est pas dans la liste. Ajoute-le avec `!add {name}#TAG`.")
         return
 
-    # On charge le cache
-    all_stats = load_stats()
-    cached = all_stats.get(player["uuid"])
-
-    async with aiohttp.ClientSession() as session:
-        # Classement actuel
-        league = await get_league(session, player['uuid'])
-        
-        # Compos : soit depuis le cache, soit on recalcule
-        if cached and "comps" in cached:
-            comp_stats = cached["comps"]
-        else:
-            comp_stats = await analyze_comps(session, player['uuid'], count=60)
-            all_stats[player["uuid"]] = {
-                "name": player["name"],
-                "region": REGION,
-                "comps": comp_stats,
-            }
-            save_stats(all_stats)
+    await ctx.defer()
+
+    async def analyze():
+        # Compos : le cache est complété avec les nouvelles parties seulement
+        # (en général déjà à jour grâce à comp_ingester)
+        # Les nouvelles parties vont aussi dans la table de !meta : le high-water mark
+        # avancé ici est celui de l'ingestion, qui ne les reverra pas
+        cached = await load_comp_cache(player["uuid"])
+        comp_stats, last_match_id = await analyze_comps(bot.riot, player['uuid'], cached, count=60,
+                                                        platform=player['platform'], analytics=bot.analytics)
+        if not cached or last_match_id != cached.get("last_match_id"):
+            await save_comp_cache(player, comp_stats, last_match_id)
+            await asyncio.to_thread(bot.analytics.save)
+        return comp_stats
+
+    def update_comps():
+        # Une seule mise à jour par joueur à la fois, même si elle a dépassé le budget d'un !stats précédent
+        uuid = player["uuid"]
+        if uuid not in bot.comp_updates:
+            bot.comp_updates[uuid] = asyncio.ensure_future(analyze())
+            bot.comp_updates[uuid].add_done_callback(lambda _: bot.comp_updates.pop(uuid, None))
+        return bot.comp_updates[uuid]
+
+    # Classement actuel : affiché tout de suite, les compos complètent le message ensuite.
+    # Riot trop lent : dernière league connue, marquée comme telle
+    league, fresh = await league_within_budget(player)
+    stale_note = "" if fresh else f" {STALE_MARK} *dernière valeur connue*"
 
     if not league:
-        await ctx.send(f"⚪ **{name}** n'a **pas de classement TFT**.")
+        await ctx.send(f"⚪ **{name}** n'a **pas de classement TFT**.{stale_note}")
+        await within_budget(update_comps())
         return
 
     # ---- Extraction des stats ----
@@ -335,13 +1030,13 @@ async def stats(ctx, *, name: str):
     # Embed stylé
     embed = discord.Embed(
         title=f"📊 Statistiques TFT — {name}",
-        description=f"Statistiques actuelles sur **{REGION.upper()}**",
+        description=f"Statistiques actuelles sur **{platform_label(player['platform'])}**",
         color=0x3498db
     )
 
     embed.add_field(
         name="🏆 Rang",
-        value=f"**{tier} {rank_div}** ({lp} LP)",
+        value=f"**{tier} {rank_div}** ({lp} LP){stale_note}",
         inline=False
     )
 
@@ -364,60 +1059,26 @@ async def stats(ctx, *, name: str):
     )
 
     # ---------- Bloc "compos" ----------
-    if comp_stats:
-        # compo la plus jouée
-        most_played_name, most_played = max(
-            comp_stats.items(),
-            key=lambda item: item[1]["games"]
-        )
-
-        MIN_GAMES_FOR_WR = 3
-        eligible = {
-            n: s for n, s in comp_stats.items()
-            if s["games"] >= MIN_GAMES_FOR_WR
-        } or comp_stats
-
-        best_name, best_stats = max(
-            eligible.items(),
-            key=lambda item: _winrate(item[1])
-        )
-        worst_name, worst_stats = min(
-            eligible.items(),
-            key=lambda item: _winrate(item[1])
-        )
-
-        most_avg = _avg_placement(most_played)
-        best_avg = _avg_placement(best_stats)
-        worst_avg = _avg_placement(worst_stats)
-
-        most_wr = _winrate(most_played)
-        best_wr = _winrate(best_stats)
-        worst_wr = _winrate(worst_stats)
-
-        line = (
-            f"**Compo la plus jouée :** {most_played_name} "
-            f"({most_played['games']} games) : AVG --> {most_avg} ({most_wr}% WR)\n"
-            f"**Meilleure compo :** {best_name} "
-            f"({best_stats['games']} games) : AVG --> {best_avg} ({best_wr}% WR)\n"
-            f"**Pire compo :** {worst_name} "
-            f"({worst_stats['games']} games) : AVG --> {worst_avg} ({worst_wr}% WR)"
-        )
-
-        embed.add_field(
-            name="🍀 Data compos",
-            value=line,
-            inline=False
-        )
-    else:
-        embed.add_field(
-            name="🍀 Data compos",
-            value="Pas assez de données récentes (set 16) pour analyser les compositions.",
-            inline=False
-        )
+    embed.add_field(
+        name="🍀 Data compos",
+        value="⏳ Analyse des dernières parties…",
+        inline=False
+    )
+    comp_field = len(embed.fields) - 1
 
     embed.set_footer(text="Données issues de l'API Riot Games")
 
-    await ctx.send(embed=embed)
+    message = await ctx.send(embed=embed)
+    comp_stats, fresh = await within_budget(update_comps())
+    if fresh:
+        comps = _comp_summary(comp_stats)
+    else:
+        # Le rang est déjà affiché : compos du cache, la mise à jour continue en fond
+        cached = await load_comp_cache(player["uuid"])
+        comps = (f"{_comp_summary((cached or {}).get('comps'))}\n"
+                 f"{STALE_MARK} *Dernières données connues : l'API Riot ne répond pas assez vite.*")
+    embed.set_field_at(comp_field, name="🍀 Data compos", value=comps, inline=False)
+    await message.edit(embed=embed)
     
 @bot.command()
 async def compare(ctx, *, args: str):
@@ -427,11 +1088,10 @@ async def compare(ctx, *, args: str):
         return await ctx.send("❌ Utilisation incorrecte.\nFormat : `!compare \"pseudo1\" \"pseudo2\"`")
 
     player1, player2 = players
-    players = load_players()
 
     # Récupérer les joueurs
-    p1 = next((p for p in players if p['name'].lower() == player1.lower()), None)
-    p2 = next((p for p in players if p['name'].lower() == player2.lower()), None)
+    p1 = bot.players.find(ctx.guild.id, player1)
+    p2 = bot.players.find(ctx.guild.id, player2)
 
     if not p1:
         await ctx.send(f"❌ Le joueur **{player1}** n'est pas dans la liste.")
@@ -440,9 +1100,7 @@ async def compare(ctx, *, args: str):
         await ctx.send(f"❌ Le joueur **{player2}** n'est pas dans la liste.")
         return
 
-    async with aiohttp.ClientSession() as session:
-        l1 = await get_league(session, p1['uuid'])
-        l2 = await get_league(session, p2['uuid'])
+    (l1, fresh1), (l2, fresh2) = await asyncio.gather(league_within_budget(p1), league_within_budget(p2))
 
     if not l1 or not l2:
         await ctx.send("❌ Les deux joueurs doivent être **classés** pour une comparaison.")
@@ -468,6 +1126,9 @@ async def compare(ctx, *, args: str):
         color=0xe67e22
     )
 
+    if not (fresh1 and fresh2):
+        embed.set_footer(text=f"{STALE_MARK} Dernières valeurs connues : l'API Riot ne répond pas assez vite")
+
     embed.add_field(
         name=f"🟦 {player1}",
         value=f"**{t1} {d1}** ({lp1} LP)\nWR: **{wr1}%**\nGames: {g1}",
@@ -496,33 +1157,37 @@ async def compare(ctx, *, args: str):
 
     await ctx.send(embed=embed)
     
-@bot.command()
+@bot.hybrid_command(description="Les 5 dernières parties d'un joueur suivi")
+@commands.guild_only()
+@app_commands.describe(name="Pseudo du joueur")
 async def history(ctx, *, name: str):
-    players = load_players()
-    player = next((p for p in players if p['name'].lower() == name.lower()), None)
+    player = bot.players.find(ctx.guild.id, name)
 
     if not player:
         await ctx.send(f"❌ **{name}** n'est pas dans la liste.")
         return
 
-    async with aiohttp.ClientSession() as session:
-        # Récupérer les 5 derniers match IDs
-        match_ids = await get_match_ids(session, player['uuid'], 5)
+    await ctx.defer()
 
-        if not match_ids:
-            await ctx.send("❌ Impossible de récupérer l'historique.")
-            return
+    # Récupérer les 5 derniers match IDs (les derniers connus si Riot est trop lent)
+    match_ids, fresh = await match_ids_within_budget(player, 5)
 
-        matches = []
-        for match_id in match_ids:
-            data = await get_match_data(session, match_id)
+    if not match_ids:
+        await ctx.send("❌ Impossible de récupérer l'historique.")
+        return
+
+    # Matchs récupérés en parallèle, mais traités dans l'ordre (dans la limite du budget)
+    matches = []
+    received = 0
+    async with aclosing(iter_matches_within(match_ids)) as results:
+        async for match_id, data in results:
+            received += 1
             if not data:
                 continue
             # Chercher le participant correspondant
-            for p in data["info"]["participants"]:
-                if p["puuid"] == player["uuid"]:
-                    matches.append(p)
-                    break
+            participant = data.participant(player["uuid"])
+            if participant:
+                matches.append((data, participant))
 
     # Embed historique
     embed = discord.Embed(
@@ -530,18 +1195,23 @@ async def history(ctx, *, name: str):
         color=0x9b59b6
     )
 
-    for i, m in enumerate(matches, 1):
-        placement = m["placement"]
-        queue = m.get("tft_game_type", "Ranked/Normal")
-        time = m["time_eliminated"]
+    for i, (match, m) in enumerate(matches, 1):
+        placement = m.placement
+        queue = match.game_type or "Ranked/Normal"
+        eliminated = m.time_eliminated
 
         embed.add_field(
             name=f"Partie #{i} — Top **{placement}**",
-            value=f"Mode : `{queue}`\nTemps élimination : {round(time/60)} min",
+            value=f"Mode : `{queue}`\nTemps élimination : {round(eliminated/60)} min",
             inline=False
         )
 
-    embed.set_footer(text="Top 1 = incroyable. Top 8 = dommage 😭")
+    footer = "Top 1 = incroyable. Top 8 = dommage 😭"
+    if not fresh:
+        footer += f" | {STALE_MARK} Historique en cache : l'API Riot ne répond pas assez vite"
+    if received < len(match_ids):
+        footer += f" | {STALE_MARK} {len(match_ids) - received} partie(s) encore en chargement"
+    embed.set_footer(text=footer)
 
     await ctx.send(embed=embed)
 
@@ -549,12 +1219,20 @@ async def history(ctx, *, name: str):
 async def commande(ctx):
     embed = discord.Embed(
         title="📘 Commandes disponibles",
+        description="`/classement`, `/nolife`, `/stats`, `/ranked` et `/history` existent aussi en commandes slash.",
         color=0x2ecc71
     )
 
     embed.add_field(
-        name="➕ !add <pseudo#tag>",
-        value="Ajoute un joueur au classement.\n**Exemple :** `!add Toto#EUW`",
+        name="➕ !add <pseudo#tag> [région]",
+        value="Ajoute un joueur au classement (EUW par défaut).\n**Exemple :** `!add Toto#EUW` ou `!add Toto#1234 NA`",
+        inline=False
+    )
+
+    embed.add_field(
+        name="📥 !addmany <pseudo#tag, ...>",
+        value="Ajoute plusieurs joueurs d'un coup (séparés par des virgules ou un par ligne), "
+              "ou depuis un fichier .txt joint.\n**Exemple :** `!addmany Toto#EUW, Titi#1234 NA`",
         inline=False
     )
 
@@ -596,7 +1274,8 @@ async def commande(ctx):
 
     embed.add_field(
         name="📜 !ranked <pseudo>",
-        value="Affiche les 5 dernières games ranked (sur les 20 dernières games).\nExemple : !ranked Toto",
+        value="Affiche les 5 dernières games ranked (sur les 20 dernières games) dans une seule image.\n"
+              "Ajoute `--split` pour un message par game.\nExemple : !ranked Toto",
         inline=False
     )
 
@@ -606,6 +1285,18 @@ async def commande(ctx):
         inline=False
     )
 
+    embed.add_field(
+        name="📈 !progress <pseudo> [jours]",
+        value="Courbe des LP du joueur (7 derniers jours par défaut).\n**Exemple :** `!progress Toto` ou `!progress Toto 30`",
+        inline=False
+    )
+
+    embed.add_field(
+        name="🧪 !meta [pseudo]",
+        value="Meilleures compos de tous les joueurs suivis (ou d'un joueur).\n**Exemple :** `!meta` ou `!meta Toto`",
+        inline=False
+    )
+
     embed.add_field(
         name="💀 !removeAll",
         value="Supprime totalement le classement. A ne pas utiliser n'importe comment.",
@@ -614,35 +1305,42 @@ async def commande(ctx):
 
     await ctx.send(embed=embed)
 
-@bot.command(aliases=["ranked_history"])
+@bot.hybrid_command(aliases=["ranked_history"], description="Les 5 dernières ranked d'un joueur suivi, avec ses compos")
+@commands.guild_only()
+@app_commands.describe(name="Pseudo du joueur (ajoute --split pour un message par game)")
 async def ranked(ctx, *, name: str):
     name = name.strip()
+    # "--split" : ancien affichage, un message par game
+    split = name.lower().endswith("--split")
+    if split:
+        name = name[:-len("--split")].strip()
     if not name:
         return await ctx.send("❌ Tu dois préciser un pseudo. Exemple : `!ranked Toto`")
 
-    players = load_players()
-    player = next((p for p in players if p["name"].lower() == name.lower()), None)
+    player = bot.players.find(ctx.guild.id, name)
     if not player:
         return await ctx.send(f"❌ **{name}** n'est pas dans la liste.")
 
+    await ctx.defer()
+
     # Récupérer les 20 dernières parties, filtrer les 5 ranked les plus récentes
-    async with aiohttp.ClientSession() as session:
-        match_ids = await get_match_ids(session, player["uuid"], 20)
-        if not match_ids:
-            return await ctx.send("❌ Impossible de récupérer l'historique.")
-
-        ranked_matches = []
-        for match_id in match_ids:
-            data = await get_match_data(session, match_id)
+    match_ids, fresh = await match_ids_within_budget(player, 20)
+    if not match_ids:
+        return await ctx.send("❌ Impossible de récupérer l'historique.")
+
+    # Matchs récupérés en parallèle et traités dans l'ordre ; dès qu'on a les
+    # 5 ranked, on sort et les requêtes encore en cours sont annulées
+    # (dans la limite du budget : les suivants arrivent en fond pour la prochaine fois)
+    ranked_matches = []
+    async with aclosing(iter_matches_within(match_ids)) as results:
+        async for match_id, data in results:
             if not data:
                 continue
-            info = data.get("info", {})
-            if info.get("queue_id") != 1100:  # only ranked
+            if data.queue_id != 1100:  # only ranked
                 continue
-            for pinfo in info.get("participants", []):
-                if pinfo["puuid"] == player["uuid"]:
-                    ranked_matches.append(pinfo)
-                    break
+            pinfo = data.participant(player["uuid"])
+            if pinfo:
+                ranked_matches.append((match_id, pinfo))
             if len(ranked_matches) >= 5:
                 break
 
@@ -655,94 +1353,90 @@ async def ranked(ctx, *, name: str):
         4: "🙂", 5: "🙃", 6: "😥", 7: "😢", 8: "😭"
     }
 
-    # Génère l'image compacte d'une compo (étoiles en '*')
-    async def build_comp_image(units):
-        from io import BytesIO
-        from PIL import Image, ImageDraw, ImageFont
-
-        size = 80
-        star_band_height = 28  # bande au dessus des icônes pour les étoiles
+    # Icônes (déjà redimensionnées, depuis le cache) + étoiles d'une compo
+    async def comp_icons(units):
+        """(icônes, tiers, complet) : une icône introuvable est sautée, `complet` le signale."""
+        icons = await bot.icons.get_many([character_id for character_id, _ in units])
 
         champ_imgs = []
         tiers = []
+        for (_, tier), img in zip(units, icons):
+            if img is None:
+                continue
+            champ_imgs.append(img)
+            tiers.append(tier)
+        return champ_imgs, tiers, len(champ_imgs) == len(units)
+
+    # PNG depuis le cache de rendus, sinon icônes + rendu Pillow dans le pool de workers.
+    # render() renvoie (png, complet) : une image à qui il manque des icônes n'est pas
+    # mise en cache, elle sera refaite quand CommunityDragon les fournira
+    async def cached_render(key, render):
+        png = await bot.render_cache.get(key)
+        if png is None:
+            png, complete = await render()
+            if png and complete:
+                await bot.render_cache.put(key, png)
+        return png
+
+    if not split:
+        # Une seule image (une ligne par game) => un seul message Discord
+        lines = []
+        for idx, (_, m) in enumerate(ranked_matches, 1):
+            placement = m.placement or 0
+            emoji = PLACEMENT_EMOJIS.get(placement, "")
+            minutes = round(m.time_eliminated / 60)
+            lines.append(f"**Game #{idx}** — TOP {placement} {emoji} — ⏱️ {minutes} min")
+
+        async def render_all():
+            # Toutes les compos d'un coup : les icônes manquantes sont récupérées en parallèle
+            comps = await asyncio.gather(*(comp_icons(m.units) for _, m in ranked_matches))
+            rows = []
+            for idx, ((_, m), (champ_imgs, tiers, _)) in enumerate(zip(ranked_matches, comps), 1):
+                placement = m.placement or 0
+                minutes = round(m.time_eliminated / 60)
+                rows.append((f"Game #{idx} - TOP {placement} - {minutes} min", placement, champ_imgs, tiers))
+            return await bot.renderer.render_history(rows), all(complete for _, _, complete in comps)
+
+        embed = discord.Embed(
+            title=f"🎮 Dernières ranked — {player['name']}",
+            description="\n".join(lines),
+            color=0x9b59b6
+        )
+        if not fresh:
+            embed.set_footer(text=f"{STALE_MARK} Historique en cache : l'API Riot ne répond pas assez vite")
 
-        async with aiohttp.ClientSession() as sub_session:
-            for u in units:
-                cid = u.get("character_id")
-                if not cid:
-                    continue
-                url = get_icon_url(cid)
-                try:
-                    async with sub_session.get(url) as resp:
-                        if resp.status != 200:
-                            continue
-                        data = await resp.read()
-                except:
-                    continue
-
-                try:
-                    img = Image.open(BytesIO(data)).convert("RGBA")
-                    img = img.resize((size, size))
-                    champ_imgs.append(img)
-                    tiers.append(u.get("tier", 1))
-                except:
-                    continue
-
-        if not champ_imgs:
-            return None
-
-        def tier_str(t):
-            t = max(1, min(3, int(t)))
-            return "*" * t
+        key = RenderCache.key("history", [mid for mid, _ in ranked_matches], player["uuid"])
+        fname = f"ranked_{player['name']}.png"
+        png = await bot.render_cache.get(key)
+        if png:
+            embed.set_image(url=f"attachment://{fname}")
+            return await ctx.send(embed=embed, file=discord.File(BytesIO(png), filename=fname))
 
-        width = size * len(champ_imgs)
-        height = star_band_height + size
-        final_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(final_img)
+        # Image pas encore rendue : les résultats d'abord, l'image est ajoutée au message ensuite
+        message = await ctx.send(embed=embed)
+        png = await cached_render(key, render_all)
+        if png:
+            embed.set_image(url=f"attachment://{fname}")
+            await message.edit(embed=embed, attachments=[discord.File(BytesIO(png), filename=fname)])
+        return message
 
-        # Police sûre
-        try:
-            # prefer builtin pillow test font (toujours présent)
-            import PIL as _PIL
-            font_path = os.path.join(os.path.dirname(_PIL.__file__), "Tests/fonts/FreeMono.ttf")
-            font = ImageFont.truetype(font_path, 14)
-        except Exception:
-            font = ImageFont.load_default()
-
-        for idx, champ_img in enumerate(champ_imgs):
-            x = idx * size
-            stars = tier_str(tiers[idx])
-
-            # Mesure du texte avec textbbox (compat Pillow 10+)
-            bbox = draw.textbbox((0, 0), stars, font=font)
-            text_w = bbox[2] - bbox[0]
-            text_h = bbox[3] - bbox[1]
-            tx = x + (size - text_w) // 2
-            ty = (star_band_height - text_h) // 2
-
-            # contour noir (4 directions) + texte blanc
-            draw.text((tx + 1, ty + 1), stars, fill=(0, 0, 0), font=font)
-            draw.text((tx - 1, ty + 1), stars, fill=(0, 0, 0), font=font)
-            draw.text((tx + 1, ty - 1), stars, fill=(0, 0, 0), font=font)
-            draw.text((tx - 1, ty - 1), stars, fill=(0, 0, 0), font=font)
-            draw.text((tx, ty), stars, fill=(255, 255, 255), font=font)
-
-            final_img.paste(champ_img, (x, star_band_height), champ_img)
-
-        buf = BytesIO()
-        final_img.save(buf, format="PNG")
-        buf.seek(0)
-        return buf
+    async def render_one(units):
+        champ_imgs, tiers, complete = await comp_icons(units)
+        if not champ_imgs:
+            return None, False
+        return await bot.renderer.render_comp(champ_imgs, tiers), complete
 
     # Pour chaque ranked, envoi d'un embed compact (titre + image)
-    for idx, m in enumerate(ranked_matches, 1):
-        placement = m.get("placement", 0)
+    for idx, (match_id, m) in enumerate(ranked_matches, 1):
+        placement = m.placement or 0
         emoji = PLACEMENT_EMOJIS.get(placement, "")
-        minutes = round(m.get("time_eliminated", 0) / 60)
-        units = m.get("units", [])
+        minutes = round(m.time_eliminated / 60)
+        units = m.units
 
         # build image
-        comp_buf = await build_comp_image(units)
+        key = RenderCache.key("comp", [match_id], player["uuid"])
+        png = await cached_render(key, lambda: render_one(units))
+        comp_buf = BytesIO(png) if png else None
 
         title = f"Game #{idx} — TOP {placement} {emoji} — ⏱️ {minutes} min"
         embed = discord.Embed(title=title, color=0x9b59b6)
@@ -758,55 +1452,178 @@ async def ranked(ctx, *, name: str):
             await ctx.send(embed=embed)
 
 @bot.command()
-async def nolife(ctx):
-    players = load_players()
-    if not players:
-        return await ctx.send("❌ Aucun joueur enregistré.")
+async def meta(ctx, *, name: str = None):
+    # Tout le roster, ou un seul joueur avec !meta <pseudo>
+    title = "🧪 Meta des joueurs suivis"
+    puuids = [p["uuid"] for p in bot.players.roster(ctx.guild.id)]
+    if name:
+        player = bot.players.find(ctx.guild.id, name)
+        if not player:
+            return await ctx.send(f"❌ **{name}** n'est pas dans la liste.")
+        title = f"🧪 Meilleures compos — {player['name']}"
+        puuids = [player["uuid"]]
+
+    rows = bot.analytics.comp_table(puuids, min_games=META_MIN_GAMES)
+    if not rows:
+        return await ctx.send(f"⚪ Pas encore assez de parties ranked (min. {META_MIN_GAMES} par compo).")
 
-    results = []
+    lines = []
+    for i, r in enumerate(rows[:10], 1):
+        lines.append(
+            f"**{i}. {r['comp']}** : AVG --> {r['avg_placement']} | "
+            f"Top 4 : {r['top4_rate']}% | Top 1 : {r['top1_rate']}% "
+            f"({r['games']} games, {r['players']} joueurs)"
+        )
 
-    async with aiohttp.ClientSession() as session:
-        for p in players:
-            name = p["name"]
-            puuid = p["uuid"]
+    embed = discord.Embed(title=title, description="\n".join(lines), color=0x1abc9c)
+    embed.set_footer(text=f"Classé par placement moyen | min. {META_MIN_GAMES} games par compo (set {TFT_SET}, ranked)")
+    await ctx.send(embed=embed)
 
-            league = await get_league(session, puuid)
-            if not league:
-                continue  # joueur unranked → pas de stats
+@bot.hybrid_command(description="Les 10 joueurs suivis avec le plus de parties classées")
+@commands.guild_only()
+async def nolife(ctx):
+    players = bot.players.roster(ctx.guild.id)
+    if not players:
+        return await ctx.send("❌ Aucun joueur enregistré.")
 
-            wins = league.get("wins", 0)
-            losses = league.get("losses", 0)
-            total = wins + losses
+    await ctx.defer()
 
-            results.append((name, total, wins, losses))
+    def build_embed(leaderboard, progress):
+        # Déjà trié par total de parties décroissant (joueurs unranked exclus)
+        results = leaderboard.by_games
+        if not results and progress is None:
+            return None
 
-    if not results:
-        return await ctx.send("⚪ Aucun joueur n'a de parties classées.")
+        top10 = results[:10]
 
-    # Tri décroissant par total de parties
-    results.sort(key=lambda x: x[1], reverse=True)
+        embed = discord.Embed(
+            title="🏆 TOP 10 des plus gros no-life TFT",
+            description="Classement basé sur le total **de parties classées jouées**.\n",
+            color=0xe67e22
+        )
 
-    top10 = results[:10]
+        medals = ["🥇", "🥈", "🥉"]
+
+        lines = []
+        for i, (name, total, wins, losses) in enumerate(top10, start=1):
+            medal = medals[i-1] if i <= 3 else f"#{i}"
+            mark = f" {STALE_MARK}" if name in leaderboard.stale else ""
+            lines.append(
+                f"**{medal} — {name}**{mark} : `{total}` games "
+                f"(🔵 {wins} / 🔴 {losses})"
+            )
+        if progress is not None:
+            lines.append(_progress_text(progress))
+
+        embed.add_field(name="Classement", value="\n".join(lines), inline=False)
+        updated = "mise à jour en cours" if progress is not None else f"Données {format_age(leaderboard.age)}"
+        embed.set_footer(text=f"Basé sur les statistiques classées Riot Games | {updated}{_stale_note(leaderboard)}")
+        return embed
+
+    await send_leaderboard(ctx, build_embed, "⚪ Aucun joueur n'a de parties classées.")
+
+@bot.command(aliases=["progression"])
+async def progress(ctx, *, name: str):
+    # Nombre de jours optionnel en fin de commande : "!progress Toto 30"
+    player = bot.players.find(ctx.guild.id, name)
+    days = PROGRESS_DEFAULT_DAYS
+    rest, _, last = name.strip().rpartition(' ')
+    if not player and rest and last.isdigit():
+        name, days = rest, max(1, int(last))
+        player = bot.players.find(ctx.guild.id, name)
+    if not player:
+        return await ctx.send(f"❌ **{name}** n'est pas dans la liste.")
 
+    # Uniquement des données locales (échantillons du poller) : aucun appel Riot
+    now = time.time()
+    since = now - days * 86400
+    samples = await asyncio.to_thread(bot.lp_history.series, player["uuid"], since)
+    if not len(samples):
+        return await ctx.send(f"⚪ Pas encore d'historique de LP pour **{player['name']}**.")
+
+    # Le premier relevé peut précéder la période : c'est l'état au début de celle-ci
+    timestamps = [max(ts, since) for ts in samples["ts"].tolist()]
+    values = [ladder_lp(int(score)) for score in samples["score"]]
+    # Le dernier état est toujours valable maintenant : la courbe va jusqu'à aujourd'hui
+    timestamps.append(now)
+    values.append(values[-1])
+
+    first, last = samples[0], samples[-1]
+    delta = values[-1] - values[0]
+    games = int(last["wins"]) + int(last["losses"]) - int(first["wins"]) - int(first["losses"])
     embed = discord.Embed(
-        title="🏆 TOP 10 des plus gros no-life TFT",
-        description="Classement basé sur le total **de parties classées jouées**.\n",
-        color=0xe67e22
+        title=f"📈 Progression — {player['name']}",
+        description=(
+            f"**{score_label(int(first['score']))}** → **{score_label(int(last['score']))}**\n"
+            f"{'+' if delta >= 0 else ''}{delta} LP en {max(games, 0)} games sur {days} jours"
+        ),
+        color=0x3498db
     )
+    embed.set_footer(text=f"{len(samples)} relevés du classement | dernier {format_age(now - int(last['ts']))}")
 
-    medals = ["🥇", "🥈", "🥉"]
+    png = await bot.renderer.render_progress(f"Progression - {player['name']} ({days} j)", timestamps, values)
+    fname = f"progress_{player['name']}.png"
+    embed.set_image(url=f"attachment://{fname}")
+    await ctx.send(embed=embed, file=discord.File(BytesIO(png), filename=fname))
 
-    lines = []
-    for i, (name, total, wins, losses) in enumerate(top10, start=1):
-        medal = medals[i-1] if i <= 3 else f"#{i}"
-        lines.append(
-            f"**{medal} — {name}** : `{total}` games "
-            f"(🔵 {wins} / 🔴 {losses})"
-        )
+def _ms(seconds) -> str:
+    if seconds == float("inf"):
+        return "> 10 s"
+    return f"{seconds * 1000:.0f} ms"
+
+def _hist_line(label, hist) -> str:
+    return f"`{label}` : {hist.count}× | moy {_ms(hist.mean)} | p95 ≤ {_ms(hist.quantile(0.95))}"
 
-    embed.add_field(name="Classement", value="\n".join(lines), inline=False)
-    embed.set_footer(text="Basé sur les statistiques classées Riot Games")
+@bot.command()
+@commands.is_owner()
+async def perf(ctx):
+    # Réservé au propriétaire du bot : où part le temps (Riot, limiteur, rendu, stockage)
+    embed = discord.Embed(title="⏱️ Performances du bot", color=0x95a5a6)
+
+    statuses = {}
+    for labels, value in metrics.counter_series("riot_responses_total"):
+        statuses.setdefault(labels["endpoint"], []).append(f"{labels['status']}×{value}")
+    waits = {labels["endpoint"]: hist for labels, hist in metrics.histogram_series("riot_ratelimit_wait_seconds")}
+    lines = []
+    for labels, hist in sorted(metrics.histogram_series("riot_request_seconds"), key=lambda s: s[0]["endpoint"]):
+        endpoint = labels["endpoint"]
+        line = _hist_line(endpoint, hist)
+        if endpoint in waits:
+            line += f" | attente limiteur moy {_ms(waits[endpoint].mean)}"
+        lines.append(line + f"\n    {' '.join(sorted(statuses.get(endpoint, [])))}")
+    embed.add_field(name="🌐 API Riot / CDragon", value="\n".join(lines) or "Aucun appel.", inline=False)
+
+    gauges = metrics.gauge_values()
+    circuits = ", ".join(f"`{host} {endpoint}`" for host, endpoint in sorted(bot.riot.open_circuits()))
+    embed.add_field(
+        name="🚦 File du limiteur",
+        value=f"Maintenant : **{gauges.get('riot_queue_depth', 0)}** | Max : **{metrics.peak_value('riot_queue_depth')}**\n"
+              f"Disjoncteurs ouverts : {circuits or 'aucun'} | Revalidations en fond : {len(bot.background_tasks)}",
+        inline=False
+    )
 
+    caches = [
+        f"`{cache}` : {hits * 100 / total:.0f}% ({hits}/{total})"
+        for cache, (hits, total) in sorted(metrics.cache_ratios().items()) if total
+    ]
+    embed.add_field(name="🗃️ Caches (hit ratio)", value="\n".join(caches) or "Aucune donnée.", inline=False)
+
+    commands_lines = [
+        _hist_line(labels["command"], hist)
+        for labels, hist in sorted(metrics.histogram_series("command_seconds"), key=lambda s: -s[1].count)
+    ]
+    embed.add_field(name="⌨️ Commandes", value="\n".join(commands_lines[:10]) or "Aucune commande.", inline=False)
+
+    io_lines = [
+        _hist_line(labels.get("kind") or labels.get("op"), hist)
+        for name in ("render_seconds", "storage_seconds")
+        for labels, hist in sorted(metrics.histogram_series(name), key=lambda s: -s[1].count)
+    ]
+    embed.add_field(name="🖼️ Rendu / stockage", value="\n".join(io_lines[:12]) or "Aucune donnée.", inline=False)
+
+    embed.set_footer(text=f"Mesures démarrées {format_age(time.time() - metrics.started_at)} | "
+                          f"{gauges.get('players_tracked', 0)} joueurs suivis")
     await ctx.send(embed=embed)
 
-bot.run(DISCORD_TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(DISCORD_TOKEN)
@@ -0,0 +1,96 @@
+import asyncio
+import os
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
+
+from perf import metrics
+
+
+class IconCache:
+    """
+    Icônes de champions déjà décodées et redimensionnées, sur deux niveaux :
+    un LRU d'objets Image en mémoire, puis des PNG redimensionnés sur disque.
+    Les icônes manquantes sont téléchargées en parallèle, une seule fois
+    même si plusieurs rendus la demandent en même temps.
+    """
+
+    def __init__(self, riot, url_for, cache_dir, size=80, max_items=256):
+        self.riot = riot
+        self.url_for = url_for
+        self.cache_dir = cache_dir
+        self.size = size
+        self.max_items = max_items
+        self._cache = OrderedDict()
+        self._inflight = {}
+        # Atlas du set (cf. SpriteAtlas) : s'il contient l'icône, simple découpage
+        self.atlas = None
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}_{self.size}.png")
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            img = Image.open(path).convert("RGBA")
+        except OSError:
+            return None
+        return img
+
+    def _decode_and_store(self, key, data):
+        try:
+            img = Image.open(BytesIO(data)).convert("RGBA")
+            img = img.resize((self.size, self.size))
+        except OSError:
+            return None
+        # Écriture atomique : un fichier à moitié écrit ne doit jamais être relu
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        img.save(tmp, format="PNG")
+        os.replace(tmp, self._path(key))
+        return img
+
+    def _remember(self, key, img):
+        self._cache[key] = img
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_items:
+            self._cache.popitem(last=False)
+
+    async def _load(self, key):
+        img = await asyncio.to_thread(self._read_disk, key)
+        metrics.inc('cache_requests_total', cache='icon', result='disk' if img is not None else 'miss')
+        if img is None:
+            data = await self.riot.get_bytes(self.url_for(key))
+            if data is None:
+                return None
+            img = await asyncio.to_thread(self._decode_and_store, key, data)
+        if img is not None:
+            self._remember(key, img)
+        return img
+
+    async def get(self, character_id):
+        """Icône RGBA size x size du champion, None si indisponible."""
+        key = character_id.lower()
+        if self.atlas is not None and key in self.atlas:
+            metrics.inc('cache_requests_total', cache='icon', result='atlas')
+            return self.atlas.icon(key)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            metrics.inc('cache_requests_total', cache='icon', result='memory')
+            return self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            metrics.inc('cache_requests_total', cache='icon', result='shared')
+        else:
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_many(self, character_ids):
+        """Icônes dans le même ordre que `character_ids` (None pour les manquantes)."""
+        return await asyncio.gather(*(self.get(cid) for cid in character_ids))
@@ -0,0 +1,89 @@
+import time
+
+# Valeurs pour trier les tiers (score = tier_value * 1000 + division * 100 + LP)
+TIER_VALUES = {
+    'UNRANKED': 0, 'IRON': 100, 'BRONZE': 200, 'SILVER': 300, 'GOLD': 400,
+    'PLATINUM': 500, 'EMERALD': 600, 'DIAMOND': 700, 'MASTER': 800,
+    'GRANDMASTER': 900, 'CHALLENGER': 1000
+}
+
+RANK_VALUES = {'IV': 0, 'III': 1, 'II': 2, 'I': 3}
+
+
+def get_score(league):
+    tier = league['tier']
+    lp = league['leaguePoints']
+    div = league['rank']
+    return TIER_VALUES.get(tier, 0) * 1000 + RANK_VALUES.get(div, 0) * 100 + lp
+
+
+# Premier tier "apex" : au-delà, un seul palier avec des LP continus
+APEX_TIER = 'MASTER'
+LP_PER_TIER = 400
+
+
+def ladder_lp(score):
+    """
+    Score get_score -> LP cumulés depuis Iron IV 0 LP (400 par tier, 100 par division),
+    pour tracer une progression sans les sauts de 1000 points du score entre deux tiers.
+    Master, Grandmaster et Challenger partagent la même échelle de LP.
+    """
+    tier_value = score // 100000 * 100
+    rest = score - tier_value * 1000  # division * 100 + LP
+    index = tier_value // 100 - 1
+    if tier_value >= TIER_VALUES[APEX_TIER]:
+        return (TIER_VALUES[APEX_TIER] // 100 - 1) * LP_PER_TIER + rest - RANK_VALUES['I'] * 100
+    return index * LP_PER_TIER + rest
+
+
+def score_label(score):
+    """Score get_score -> "GOLD II (50 LP)"."""
+    tier_value = score // 100000 * 100
+    rest = score - tier_value * 1000
+    tier = next((t for t, v in TIER_VALUES.items() if v == tier_value), 'UNRANKED')
+    if tier_value >= TIER_VALUES[APEX_TIER]:
+        return f"{tier} ({rest - RANK_VALUES['I'] * 100} LP)"
+    div = next((d for d, v in RANK_VALUES.items() if v == rest // 100), '')
+    return f"{tier} {div} ({rest % 100} LP)"
+
+
+def format_age(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"il y a {seconds} s"
+    if seconds < 3600:
+        return f"il y a {seconds // 60} min"
+    return f"il y a {seconds // 3600} h"
+
+
+class Leaderboard:
+    """
+    Photo du classement calculée une fois par le poller : tri par score
+    (`!classement`) et par nombre de parties (`!nolife`) déjà faits.
+    `stale` : joueurs affichés avec leur dernière league connue (Riot n'a pas
+    répondu à temps) ; `pending` : joueurs dont on ne connaît encore aucune league.
+    """
+
+    def __init__(self, entries, updated_at=None, stale=(), pending=()):
+        # entries : [(name, league ou None), ...]
+        self.updated_at = updated_at if updated_at is not None else time.time()
+        self.stale = set(stale)
+        self.pending = list(pending)
+        self.ranked = sorted(
+            ((name, league) for name, league in entries if league),
+            key=lambda x: get_score(x[1]),
+            reverse=True
+        )
+        self.unranked = [name for name, league in entries if not league]
+        self.by_games = sorted(
+            (
+                (name, league.get('wins', 0) + league.get('losses', 0), league.get('wins', 0), league.get('losses', 0))
+                for name, league in self.ranked
+            ),
+            key=lambda x: x[1],
+            reverse=True
+        )
+
+    @property
+    def age(self):
+        return time.time() - self.updated_at
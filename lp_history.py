@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from perf import metrics
+
+# Un échantillon = 20 octets : empreinte du puuid, timestamp, score (get_score), wins, losses
+RECORD = np.dtype([("key", "<u8"), ("ts", "<u4"), ("score", "<i4"), ("wins", "<u2"), ("losses", "<u2")])
+# Sous-échantillonnage : brut sur 48 h, un point par heure jusqu'à 30 jours, un par jour au-delà
+RAW_SECONDS = 48 * 3600
+HOURLY_SECONDS = 30 * 86400
+# Intervalle minimum entre deux compactages (cf. maybe_compact)
+COMPACT_SECONDS = 3600
+
+
+def puuid_key(puuid):
+    """Empreinte 64 bits du puuid : largeur fixe, collisions négligeables à l'échelle d'un roster."""
+    return int.from_bytes(hashlib.blake2b(puuid.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class LPHistory:
+    """
+    Historique du classement de chaque joueur suivi, dans un fichier binaire en
+    ajout seul : enregistrements à largeur fixe (RECORD), lus par mmap sans tout
+    charger. Un échantillon n'est ajouté que si le score ou le nombre de games
+    a changé depuis le précédent. compact() réécrit le fichier en gardant le
+    dernier échantillon de chaque heure (au-delà de 48 h) ou de chaque jour
+    (au-delà de 30 jours).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.compacted_at = 0
+        # Dernier (score, wins, losses) écrit par empreinte de puuid
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records())
+
+    def _records(self):
+        # Taille lue sur le fichier ouvert, pas sur le chemin : compact() (dans un autre thread)
+        # peut le remplacer par un plus petit entre-temps ; le mapping garde l'ancien
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return np.empty(0, dtype=RECORD)
+        with f:
+            # Une écriture interrompue peut laisser un enregistrement partiel en fin de fichier : ignoré
+            count = os.fstat(f.fileno()).st_size // RECORD.itemsize
+            if not count:
+                return np.empty(0, dtype=RECORD)
+            return np.memmap(f, dtype=RECORD, mode="r", shape=(count,))
+
+    def load(self):
+        """Relit le dernier échantillon de chaque joueur (pour ne pas réécrire un état inchangé)."""
+        with self._lock:
+            records = self._records()
+            # Dernière occurrence de chaque clé : première occurrence dans le tableau inversé
+            keys, first = np.unique(records["key"][::-1], return_index=True)
+            last = len(records) - 1 - first
+            self._last = {
+                int(k): (int(records["score"][i]), int(records["wins"][i]), int(records["losses"][i]))
+                for k, i in zip(keys, last)
+            }
+
+    def append(self, samples, ts=None):
+        """
+        Ajoute les échantillons [(puuid, score, wins, losses)] qui ont changé.
+        Renvoie le nombre d'enregistrements écrits.
+        """
+        ts = int(ts if ts is not None else time.time())
+        with self._lock:
+            rows = []
+            for puuid, score, wins, losses in samples:
+                key = puuid_key(puuid)
+                state = (int(score), int(wins), int(losses))
+                if self._last.get(key) == state:
+                    continue
+                self._last[key] = state
+                rows.append((key, ts) + state)
+            if not rows:
+                return 0
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with metrics.timer("storage_seconds", op="lp_append"):
+                with open(self.path, "ab") as f:
+                    f.write(np.array(rows, dtype=RECORD).tobytes())
+            return len(rows)
+
+    def series(self, puuid, since=None):
+        """
+        Échantillons d'un joueur triés par date : tableau RECORD (copie, indépendant du fichier).
+        Avec `since`, le dernier échantillon antérieur est gardé : c'est l'état au début de la période.
+        """
+        with metrics.timer("storage_seconds", op="lp_series"):
+            records = self._records()
+            found = np.array(records[records["key"] == np.uint64(puuid_key(puuid))])
+        found = found[np.argsort(found["ts"], kind="stable")]
+        if since is not None:
+            found = found[max(0, np.searchsorted(found["ts"], since) - 1):]
+        return found
+
+    def compact(self, now=None):
+        """Sous-échantillonne les vieux échantillons et réécrit le fichier. Renvoie le nombre d'enregistrements gardés."""
+        now = int(now if now is not None else time.time())
+        with self._lock, metrics.timer("storage_seconds", op="lp_compact"):
+            # Copie : le fichier mappé va être remplacé
+            records = np.array(self._records())
+            self.compacted_at = now
+            age = now - records["ts"].astype(np.int64)
+            raw = age <= RAW_SECONDS
+            old = records[~raw]
+            if not len(old):
+                return len(records)
+
+            # Période de chaque vieil échantillon (tier 0 : heure, tier 1 : jour) ;
+            # on garde le dernier échantillon de chaque (joueur, tier, période)
+            daily = (now - old["ts"].astype(np.int64)) > HOURLY_SECONDS
+            period = np.where(daily, old["ts"] // 86400, old["ts"] // 3600)
+            order = np.lexsort((old["ts"], period, daily, old["key"]))
+            old, period, daily = old[order], period[order], daily[order]
+            last_of_group = np.ones(len(old), dtype=bool)
+            last_of_group[:-1] = (
+                (old["key"][1:] != old["key"][:-1])
+                | (daily[1:] != daily[:-1])
+                | (period[1:] != period[:-1])
+            )
+
+            kept = np.concatenate([old[last_of_group], records[raw]])
+            kept = kept[np.argsort(kept["ts"], kind="stable")]
+            if len(kept) == len(records):
+                return len(kept)
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(kept.tobytes())
+            os.replace(tmp, self.path)
+            return len(kept)
+
+    def maybe_compact(self, now=None):
+        """compact() au plus une fois par COMPACT_SECONDS."""
+        now = now if now is not None else time.time()
+        if now - self.compacted_at >= COMPACT_SECONDS:
+            self.compact(now)
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+from perf import metrics
+
+
+class ParticipantRecord:
+    """
+    Ce qu'on garde d'un participant : placement, élimination, traits
+    (name, tier_current, num_units) et unités (character_id, tier).
+    """
+
+    __slots__ = ("puuid", "placement", "time_eliminated", "traits", "units")
+
+    def __init__(self, puuid, placement, time_eliminated, traits, units):
+        self.puuid = puuid
+        self.placement = placement
+        self.time_eliminated = time_eliminated
+        self.traits = traits
+        self.units = units
+
+    @classmethod
+    def from_riot(cls, p):
+        return cls(
+            p.get("puuid"),
+            p.get("placement"),
+            p.get("time_eliminated", 0),
+            tuple(
+                (t.get("name", ""), t.get("tier_current", 0), t.get("num_units", 0))
+                for t in p.get("traits", [])
+            ),
+            tuple(
+                (u["character_id"], u.get("tier", 1))
+                for u in p.get("units", []) if u.get("character_id")
+            ),
+        )
+
+    def to_row(self):
+        return [self.puuid, self.placement, self.time_eliminated,
+                [list(t) for t in self.traits], [list(u) for u in self.units]]
+
+    @classmethod
+    def from_row(cls, row):
+        puuid, placement, time_eliminated, traits, units = row
+        return cls(puuid, placement, time_eliminated,
+                   tuple(tuple(t) for t in traits), tuple(tuple(u) for u in units))
+
+
+class MatchRecord:
+    """
+    Version compacte d'un match Riot : seuls les champs utilisés par le bot.
+    C'est cette forme qui est gardée en mémoire et sur disque, jamais le JSON complet.
+    """
+
+    __slots__ = ("match_id", "queue_id", "game_version", "game_datetime", "game_type", "participants")
+
+    def __init__(self, match_id, queue_id, game_version, game_datetime, game_type, participants):
+        self.match_id = match_id
+        self.queue_id = queue_id
+        self.game_version = game_version
+        self.game_datetime = game_datetime
+        self.game_type = game_type
+        self.participants = participants
+
+    def participant(self, puuid):
+        for p in self.participants:
+            if p.puuid == puuid:
+                return p
+        return None
+
+    @classmethod
+    def from_riot(cls, match_id, data):
+        info = data.get("info", {})
+        return cls(
+            match_id,
+            info.get("queue_id"),
+            info.get("game_version"),
+            info.get("game_datetime"),
+            info.get("tft_game_type"),
+            tuple(ParticipantRecord.from_riot(p) for p in info.get("participants", [])),
+        )
+
+    def to_row(self):
+        return [self.queue_id, self.game_version, self.game_datetime, self.game_type,
+                [p.to_row() for p in self.participants]]
+
+    @classmethod
+    def from_row(cls, match_id, row):
+        queue_id, game_version, game_datetime, game_type, participants = row
+        return cls(match_id, queue_id, game_version, game_datetime, game_type,
+                   tuple(ParticipantRecord.from_row(p) for p in participants))
+
+
+class MatchStore:
+    """
+    Stockage des matchs terminés (immuables) sous forme de MatchRecord : SQLite sur
+    disque (lignes JSON compressées zlib), avec un LRU en mémoire devant. Une partie
+    déjà vue ne coûte plus aucun appel Riot. Les accès disque passent par un thread
+    pour ne pas bloquer la loop.
+    """
+
+    def __init__(self, path, cache_size=4096):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS matches (match_id TEXT PRIMARY KEY, data BLOB NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, match_id, data):
+        self._cache[match_id] = data
+        self._cache.move_to_end(match_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _read(self, match_id):
+        with self._lock:
+            row = self._db().execute(
+                "SELECT data FROM matches WHERE match_id = ?", (match_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return self._decode(match_id, row[0])
+
+    def _decode(self, match_id, blob):
+        data = json.loads(zlib.decompress(blob))
+        if isinstance(data, dict):
+            # Ancienne ligne avec le JSON Riot complet : on la compacte au passage
+            record = MatchRecord.from_riot(match_id, data)
+            self._write(match_id, record)
+            return record
+        return MatchRecord.from_row(match_id, data)
+
+    def iter_records(self):
+        """Tous les matchs stockés (lecture disque : à appeler hors de la loop)."""
+        with self._lock:
+            rows = self._db().execute("SELECT match_id, data FROM matches").fetchall()
+        for match_id, blob in rows:
+            yield self._decode(match_id, blob)
+
+    def _write(self, match_id, record):
+        blob = zlib.compress(json.dumps(record.to_row(), separators=(',', ':')).encode('utf-8'))
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO matches (match_id, data) VALUES (?, ?)", (match_id, blob))
+            db.commit()
+
+    async def get(self, match_id):
+        """MatchRecord depuis le LRU ou le disque, None s'il n'a jamais été stocké."""
+        if match_id in self._cache:
+            self._cache.move_to_end(match_id)
+            metrics.inc('cache_requests_total', cache='match', result='memory')
+            return self._cache[match_id]
+        with metrics.timer('storage_seconds', op='match_read'):
+            data = await asyncio.to_thread(self._read, match_id)
+        metrics.inc('cache_requests_total', cache='match', result='disk' if data is not None else 'miss')
+        if data is not None:
+            self._remember(match_id, data)
+        return data
+
+    async def put(self, match_id, record):
+        self._remember(match_id, record)
+        with metrics.timer('storage_seconds', op='match_write'):
+            await asyncio.to_thread(self._write, match_id, record)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,424 @@
+"""
+Faux serveur Riot + CommunityDragon, pour faire tourner et mesurer le bot sans clé.
+
+Il sert des réponses enregistrées (ou générées) pour les endpoints utilisés par
+le bot : compte par Riot ID, league, IDs de matchs, matchs, données TFT et
+icônes de champions. Latence configurable, 429 injectés au hasard, et en-têtes
+X-App-Rate-Limit / X-Method-Rate-Limit comme le vrai serveur (avec 429 quand
+on dépasse les limites annoncées).
+
+    python mock_riot.py --players 100 --latency 0.05 --jitter 0.02 --error-rate 0.01
+
+puis lancer le bot avec :
+
+    RIOT_BASE_URL="http://127.0.0.1:8080/riot/{host}" CDRAGON_BASE="http://127.0.0.1:8080/cdragon" python bot_tft.py
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import zlib
+from collections import Counter
+from io import BytesIO
+
+from aiohttp import web
+from PIL import Image
+
+from ratelimit import parse_limits
+from riot_api import PLATFORM_ROUTING, match_platform
+
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER"]
+RANKS = ["IV", "III", "II", "I"]
+TRAITS = ["Demacia", "Ionia", "Noxus", "Freljord", "Piltover", "Zaun", "Shurima", "Targon", "Bilgewater", "Ixtal"]
+
+# Limites d'une clé de production : le bot se recale dessus via les en-têtes
+DEFAULT_APP_LIMITS = "500:10,30000:600"
+DEFAULT_METHOD_LIMITS = {
+    'account-by-riot-id': "1000:60",
+    'league-by-puuid': "270:60",
+    'match-ids-by-puuid': "600:10",
+    'match-by-id': "250:10",
+}
+
+
+class Fixtures:
+    """
+    Réponses servies par le faux serveur, au format JSON Riot :
+    comptes ("pseudo#tag" en minuscules), plateforme, leagues et IDs de matchs
+    par puuid, matchs par ID, et champions du set pour CommunityDragon.
+    """
+
+    def __init__(self, accounts, leagues, match_ids, matches, champions, tft_set="16", platforms=None):
+        self.accounts = accounts
+        self.leagues = leagues
+        self.match_ids = match_ids
+        self.matches = matches
+        self.champions = champions
+        self.tft_set = str(tft_set)
+        # puuid -> plateforme (euw1 si absent, comme les anciens enregistrements)
+        self.platforms = platforms or {}
+
+    def platform(self, puuid):
+        return self.platforms.get(puuid, 'euw1')
+
+    def riot_ids(self):
+        """[(pseudo, tag, puuid)] des comptes, dans l'ordre d'enregistrement."""
+        return [(a['gameName'], a['tagLine'], a['puuid']) for a in self.accounts.values()]
+
+    @classmethod
+    def generate(cls, players=100, matches_per_player=40, tft_set="16", seed=0, platforms=('euw1',)):
+        """
+        Roster synthétique : des joueurs qui jouent souvent ensemble (2 à 4 joueurs
+        suivis par lobby, complétés par des inconnus), 80 % de ranked. Les joueurs
+        sont répartis à tour de rôle sur `platforms`, chaque lobby dans une seule région.
+        """
+        rng = random.Random(seed)
+        prefix = f"TFT{tft_set}_"
+        champions = [f"{prefix}Champ{i:02d}" for i in range(60)]
+        traits = [prefix + t for t in TRAITS]
+
+        accounts, leagues, match_ids, player_platforms = {}, {}, {}, {}
+        for i in range(players):
+            platform = platforms[i % len(platforms)]
+            name, tag = f"Joueur{i}", platform.upper().rstrip('0123456789') or "EUW"
+            puuid = f"mock-{i:05d}-" + "x" * 66
+            accounts[f"{name}#{tag}".lower()] = {'puuid': puuid, 'gameName': name, 'tagLine': tag}
+            player_platforms[puuid] = platform
+            match_ids[puuid] = []
+            if rng.random() < 0.9:
+                wins = rng.randint(5, 200)
+                leagues[puuid] = [{
+                    'queueType': 'RANKED_TFT',
+                    'tier': rng.choice(TIERS),
+                    'rank': rng.choice(RANKS),
+                    'leaguePoints': rng.randint(0, 99),
+                    'wins': wins,
+                    'losses': rng.randint(5, 200),
+                }]
+            else:
+                leagues[puuid] = []
+
+        by_platform = {p: [puuid for puuid in match_ids if player_platforms[puuid] == p] for p in platforms}
+        matches = {}
+        now_ms = int(time.time() * 1000)
+        n_matches = max(1, players * matches_per_player // 3)
+        for m in range(n_matches):
+            platform = platforms[m % len(platforms)]
+            puuids = by_platform[platform]
+            if not puuids:
+                continue
+            match_id = f"{platform.upper()}_{7000000000 + m}"
+            tracked = rng.sample(puuids, min(len(puuids), rng.randint(2, 4)))
+            lobby = tracked + [f"stranger-{m}-{k}" for k in range(8 - len(tracked))]
+            placements = list(range(1, 9))
+            rng.shuffle(placements)
+            participants = []
+            for puuid, placement in zip(lobby, placements):
+                units = rng.sample(champions, rng.randint(6, 9))
+                participants.append({
+                    'puuid': puuid,
+                    'placement': placement,
+                    'time_eliminated': rng.uniform(900, 2400),
+                    'traits': [
+                        {'name': t, 'tier_current': rng.randint(0, 3), 'num_units': rng.randint(1, 6)}
+                        for t in rng.sample(traits, 4)
+                    ],
+                    'units': [{'character_id': c, 'tier': rng.choice([1, 2, 2, 3])} for c in units],
+                })
+            matches[match_id] = {
+                'metadata': {'match_id': match_id, 'participants': lobby},
+                'info': {
+                    'queue_id': 1100 if rng.random() < 0.8 else 1090,
+                    'game_version': f"Version {tft_set}.1",
+                    # Du plus récent au plus ancien, une partie toutes les 10 minutes
+                    'game_datetime': now_ms - m * 600_000,
+                    'tft_game_type': 'standard',
+                    'participants': participants,
+                },
+            }
+            for puuid in tracked:
+                match_ids[puuid].append(match_id)
+
+        return cls(accounts, leagues, match_ids, matches, champions, tft_set, player_platforms)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['accounts'], data['leagues'], data['match_ids'], data['matches'],
+                   data['champions'], data.get('tft_set', "16"), data.get('platforms'))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'tft_set': self.tft_set,
+                'accounts': self.accounts,
+                'leagues': self.leagues,
+                'match_ids': self.match_ids,
+                'matches': self.matches,
+                'champions': self.champions,
+                'platforms': self.platforms,
+            }, f)
+
+
+class _Window:
+    """Fenêtre fixe côté serveur : `limit` requêtes par tranche de `window` secondes."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.start = 0.0
+        self.count = 0
+
+    def hit(self, now):
+        if now - self.start >= self.window:
+            self.start = now
+            self.count = 0
+        self.count += 1
+        return self.count <= self.limit
+
+    def retry_after(self, now):
+        return max(1, math.ceil(self.start + self.window - now))
+
+
+def _limits_header(windows):
+    return ','.join(f"{w.limit}:{w.window}" for w in windows)
+
+
+def _counts_header(windows):
+    return ','.join(f"{w.count}:{w.window}" for w in windows)
+
+
+def _icon_png(character_id, size=128):
+    # Carré de couleur stable par champion : suffisant pour l'atlas et les rendus
+    h = zlib.crc32(character_id.encode('utf-8'))
+    color = (h & 0xff, (h >> 8) & 0xff, (h >> 16) & 0xff, 255)
+    buf = BytesIO()
+    Image.new("RGBA", (size, size), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class MockRiotServer:
+    """
+    Serveur aiohttp qui imite l'API Riot (sous /riot/{host}/...) et CommunityDragon
+    (sous /cdragon/...). `calls` compte les requêtes reçues par endpoint, `statuses`
+    les codes renvoyés : c'est ce que lit le banc de mesure (cf. bench.py).
+    """
+
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, error_rate=0.0, retry_after=1,
+                 app_limits=DEFAULT_APP_LIMITS, method_limits=None, host='127.0.0.1', port=8080,
+                 seed=None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.app_limits = parse_limits(app_limits)
+        self.method_limits = {
+            method: parse_limits(limits)
+            for method, limits in (DEFAULT_METHOD_LIMITS if method_limits is None else method_limits).items()
+        }
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.statuses = Counter()
+        self._rng = random.Random(seed)
+        # Limites comptées par hôte Riot, comme en vrai
+        self._app_windows = {}
+        self._method_windows = {}
+        self._icons = {}
+        self._runner = None
+
+    @property
+    def riot_base_url(self):
+        return f"http://{self.host}:{self.port}/riot/{{host}}"
+
+    @property
+    def cdragon_base(self):
+        return f"http://{self.host}:{self.port}/cdragon"
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.statuses.clear()
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get('/riot/{host}/riot/account/v1/accounts/by-riot-id/{name}/{tag}', self.account),
+            web.get('/riot/{host}/tft/league/v1/by-puuid/{puuid}', self.league),
+            web.get('/riot/{host}/tft/match/v1/matches/by-puuid/{puuid}/ids', self.match_ids),
+            web.get('/riot/{host}/tft/match/v1/matches/{match_id}', self.match),
+            web.get('/cdragon/cdragon/tft/en_us.json', self.tft_data),
+            web.get('/cdragon/{path:.*}.png', self.icon),
+        ])
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port=0 : port libre choisi par l'OS
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _delay(self):
+        delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _respond(self, endpoint, status, body=None, headers=None):
+        self.statuses[(endpoint, status)] += 1
+        if body is None:
+            return web.json_response({'status': {'status_code': status}}, status=status, headers=headers)
+        return web.json_response(body, status=status, headers=headers)
+
+    async def _riot(self, request, method, lookup):
+        """Latence, limites et 429 injectés communs à tous les endpoints Riot."""
+        self.calls[method] += 1
+        await self._delay()
+        if 'api_key' not in request.query:
+            return self._respond(method, 401)
+
+        riot_host = request.match_info['host']
+        now = time.monotonic()
+        app_windows = self._app_windows.setdefault(
+            riot_host, [_Window(limit, window) for limit, window in self.app_limits])
+        method_windows = self._method_windows.setdefault(
+            (riot_host, method), [_Window(limit, window) for limit, window in self.method_limits.get(method, [])])
+        app_ok = all([w.hit(now) for w in app_windows])
+        method_ok = all([w.hit(now) for w in method_windows])
+        headers = {
+            'X-App-Rate-Limit': _limits_header(app_windows),
+            'X-App-Rate-Limit-Count': _counts_header(app_windows),
+        }
+        if method_windows:
+            headers['X-Method-Rate-Limit'] = _limits_header(method_windows)
+            headers['X-Method-Rate-Limit-Count'] = _counts_header(method_windows)
+
+        if not app_ok or not method_ok:
+            windows = app_windows if not app_ok else method_windows
+            headers['Retry-After'] = str(max(w.retry_after(now) for w in windows if w.count > w.limit))
+            headers['X-Rate-Limit-Type'] = 'application' if not app_ok else 'method'
+            return self._respond(method, 429, headers=headers)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            # 429 "service" : saturation côté Riot, indépendante de notre clé
+            headers['Retry-After'] = str(self.retry_after)
+            headers['X-Rate-Limit-Type'] = 'service'
+            return self._respond(method, 429, headers=headers)
+
+        body = lookup()
+        if body is None:
+            return self._respond(method, 404, headers=headers)
+        return self._respond(method, 200, body, headers=headers)
+
+    async def account(self, request):
+        key = f"{request.match_info['name']}#{request.match_info['tag']}".lower()
+        return await self._riot(request, 'account-by-riot-id', lambda: self.fixtures.accounts.get(key))
+
+    def _on_host(self, request, puuid, cluster=False):
+        """Le joueur est-il servi par cet hôte (sa plateforme, ou son cluster régional) ?"""
+        platform = self.fixtures.platform(puuid)
+        expected = PLATFORM_ROUTING.get(platform) if cluster else platform
+        return request.match_info['host'] == expected
+
+    async def league(self, request):
+        puuid = request.match_info['puuid']
+
+        def lookup():
+            if not self._on_host(request, puuid):
+                return None
+            return self.fixtures.leagues.get(puuid)
+
+        return await self._riot(request, 'league-by-puuid', lookup)
+
+    async def match_ids(self, request):
+        puuid = request.match_info['puuid']
+
+        def lookup():
+            ids = self.fixtures.match_ids.get(puuid)
+            if ids is None or not self._on_host(request, puuid, cluster=True):
+                return None
+            start = int(request.query.get('start', 0))
+            count = int(request.query.get('count', 20))
+            return ids[start:start + count]
+
+        return await self._riot(request, 'match-ids-by-puuid', lookup)
+
+    async def match(self, request):
+        match_id = request.match_info['match_id']
+
+        def lookup():
+            if request.match_info['host'] != PLATFORM_ROUTING.get(match_platform(match_id)):
+                return None
+            return self.fixtures.matches.get(match_id)
+
+        return await self._riot(request, 'match-by-id', lookup)
+
+    async def tft_data(self, request):
+        self.calls['cdragon-data'] += 1
+        await self._delay()
+        champions = [{'apiName': c, 'traits': ['Mock']} for c in self.fixtures.champions]
+        return self._respond('cdragon-data', 200, {'sets': {self.fixtures.tft_set: {'champions': champions}}})
+
+    async def icon(self, request):
+        self.calls['cdragon-icon'] += 1
+        await self._delay()
+        # ".../<character_id>_square.tft_setXX" -> character_id
+        filename = request.match_info['path'].rsplit('/', 1)[-1]
+        character_id = filename.split('_square', 1)[0]
+        known = {c.lower(): c for c in self.fixtures.champions}
+        if character_id not in known:
+            self.statuses[('cdragon-icon', 404)] += 1
+            return web.Response(status=404)
+        if character_id not in self._icons:
+            self._icons[character_id] = _icon_png(character_id)
+        self.statuses[('cdragon-icon', 200)] += 1
+        return web.Response(body=self._icons[character_id], content_type='image/png')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Riot / CommunityDragon")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--fixtures', help="Réponses enregistrées (JSON), sinon générées")
+    parser.add_argument('--dump', help="Écrit les réponses générées dans ce fichier JSON")
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--matches-per-player', type=int, default=40)
+    parser.add_argument('--tft-set', default="16")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--platforms', nargs='+', default=['euw1'], help="Plateformes des joueurs générés")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latence de base (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Variation de latence +/- (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Part de 429 'service' injectés")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--app-limits', default=DEFAULT_APP_LIMITS)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = Fixtures.load(args.fixtures)
+    else:
+        fixtures = Fixtures.generate(args.players, args.matches_per_player, args.tft_set, args.seed,
+                                     tuple(args.platforms))
+    if args.dump:
+        fixtures.save(args.dump)
+
+    server = MockRiotServer(
+        fixtures, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        retry_after=args.retry_after, app_limits=args.app_limits, host=args.host, port=args.port,
+        seed=args.seed,
+    )
+    print(f"{len(fixtures.accounts)} comptes, {len(fixtures.matches)} matchs")
+    print(f"RIOT_BASE_URL={server.riot_base_url}")
+    print(f"CDRAGON_BASE={server.cdragon_base}")
+    web.run_app(server.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
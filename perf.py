@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from aiohttp import web
+
+# Bornes (secondes) des histogrammes de latence, comme les "le" Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Résultats de cache comptés comme des échecs (tout le reste est un hit : mémoire, disque, atlas...)
+CACHE_MISSES = {"miss", "bumped"}
+PREFIX = "tft_"
+
+
+class Histogram:
+    """Histogramme à bornes fixes : compte + somme, et quantiles approchés par la borne du bucket."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Borne haute du bucket qui contient le quantile q (inf au-delà de la dernière borne)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def copy(self):
+        hist = Histogram(self.bounds)
+        hist.counts = list(self.counts)
+        hist.sum = self.sum
+        hist.count = self.count
+        return hist
+
+
+class Metrics:
+    """
+    Mesures de perf du bot, en mémoire : histogrammes de durée, compteurs
+    (codes HTTP, hits / miss de cache, commandes) et jauges lues à la demande
+    (file du limiteur). Chaque série est un nom + des labels, comme dans Prometheus.
+    Alimentées aussi depuis les threads (SQLite, historique LP, sauvegarde des
+    analytics) : le registre est protégé par un verrou, et les lectures
+    travaillent sur une copie.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._histograms = {}
+        self._counters = Counter()
+        self._peaks = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self.buckets)
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Chronomètre un bloc (y compris avec des await dedans)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def peak(self, name, value, **labels):
+        """Garde la valeur max observée (ex. profondeur de file)."""
+        key = self._key(name, labels)
+        with self._lock:
+            if value > self._peaks.get(key, 0):
+                self._peaks[key] = value
+
+    def gauge(self, name, fn):
+        """Jauge lue au moment de l'affichage : `fn()` renvoie la valeur courante."""
+        self._gauges[name] = fn
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self._histograms.clear()
+            self._counters.clear()
+            self._peaks.clear()
+
+    def _snapshot(self):
+        """Copie (histogrammes, compteurs, pics) cohérente, lisible sans le verrou."""
+        with self._lock:
+            histograms = {key: hist.copy() for key, hist in self._histograms.items()}
+            return histograms, dict(self._counters), dict(self._peaks)
+
+    # ---------- Lecture ----------
+
+    def histogram_series(self, name):
+        """[(labels, Histogram)] de la série `name`."""
+        with self._lock:
+            return [(dict(labels), hist.copy()) for (n, labels), hist in self._histograms.items() if n == name]
+
+    def counter_series(self, name):
+        """[(labels, valeur)] de la série `name`."""
+        with self._lock:
+            return [(dict(labels), value) for (n, labels), value in self._counters.items() if n == name]
+
+    def cache_ratios(self):
+        """{cache: (hits, total)} d'après cache_requests_total."""
+        ratios = {}
+        for labels, value in self.counter_series("cache_requests_total"):
+            hits, total = ratios.get(labels["cache"], (0, 0))
+            if labels["result"] not in CACHE_MISSES:
+                hits += value
+            ratios[labels["cache"]] = (hits, total + value)
+        return ratios
+
+    def gauge_values(self):
+        values = {}
+        for name, fn in self._gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                continue
+        return values
+
+    def peak_value(self, name):
+        with self._lock:
+            return max((v for (n, _), v in self._peaks.items() if n == name), default=0)
+
+    # ---------- Export ----------
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+    def prometheus(self):
+        """Toutes les séries au format texte d'exposition Prometheus."""
+        histograms, counters, peaks = self._snapshot()
+        lines = []
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{PREFIX}{name}{self._labels(labels)} {value}")
+        for name in sorted({n for n, _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (n, labels), hist in sorted(histograms.items(), key=lambda item: item[0]):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(hist.bounds, hist.counts):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{PREFIX}{name}_bucket{self._labels(labels, [('le', '+Inf')])} {hist.count}")
+                lines.append(f"{PREFIX}{name}_sum{self._labels(labels)} {hist.sum:.6f}")
+                lines.append(f"{PREFIX}{name}_count{self._labels(labels)} {hist.count}")
+        for name in sorted({n for n, _ in peaks}):
+            lines.append(f"# TYPE {PREFIX}{name}_max gauge")
+            for (n, labels), value in sorted(peaks.items()):
+                if n == name:
+                    lines.append(f"{PREFIX}{name}_max{self._labels(labels)} {value}")
+        for name, value in sorted(self.gauge_values().items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+        lines.append(f"# TYPE {PREFIX}uptime_seconds gauge")
+        lines.append(f"{PREFIX}uptime_seconds {time.time() - self.started_at:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, text=None):
+        """
+        Écrit l'export Prometheus dans un fichier (atomique, pour le textfile collector).
+        `text` : export déjà construit (sur la boucle, où sont lues les jauges), pour
+        n'écrire que le fichier depuis un thread.
+        """
+        if text is None:
+            text = self.prometheus()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    async def serve(self, host, port):
+        """Expose /metrics en HTTP. Renvoie le runner aiohttp (à cleanup() à l'arrêt)."""
+        async def handler(request):
+            return web.Response(text=self.prometheus(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.add_routes([web.get("/metrics", handler)])
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+# Instance partagée par tous les modules du bot
+metrics = Metrics()
@@ -0,0 +1,201 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+
+# Files de priorité : une commande tapée par un joueur passe devant les backfills
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Limites d'une clé de dev tant que Riot ne nous a pas renvoyé les vraies (count, fenêtre en s)
+DEFAULT_APP_LIMITS = [(20, 1), (100, 120)]
+
+
+def parse_limits(header):
+    """'20:1,100:120' -> [(20, 1), (100, 120)]"""
+    limits = []
+    for part in (header or '').split(','):
+        if ':' not in part:
+            continue
+        count, window = part.split(':', 1)
+        try:
+            limits.append((int(count), int(window)))
+        except ValueError:
+            continue
+    return limits
+
+
+class _Bucket:
+    """Fenêtre fixe à la Riot : `limit` requêtes max par tranche de `window` secondes."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.start = 0.0
+        self.count = 0
+
+    def _roll(self, now):
+        if now - self.start >= self.window:
+            self.start = now
+            self.count = 0
+
+    def delay(self, now):
+        self._roll(now)
+        if self.count < self.limit:
+            return 0.0
+        return self.start + self.window - now
+
+    def consume(self, now):
+        self._roll(now)
+        self.count += 1
+
+    def sync(self, count, now):
+        # Le compteur côté Riot fait foi s'il est plus haut que le nôtre
+        self._roll(now)
+        self.count = max(self.count, count)
+
+
+def _make_buckets(limits):
+    return [_Bucket(limit, window) for limit, window in limits]
+
+
+def _sync_buckets(buckets, counts_header, now):
+    counts = dict((window, count) for count, window in parse_limits(counts_header))
+    for bucket in buckets:
+        if bucket.window in counts:
+            bucket.sync(counts[bucket.window], now)
+
+
+class RateLimiter:
+    """
+    Limiteur d'un hôte Riot (ex: euw1.api.riotgames.com).
+    Applique les limites "app" (toute la clé sur l'hôte) et "method" (par endpoint),
+    recalées sur les en-têtes X-App-Rate-Limit / X-Method-Rate-Limit, et distribue
+    les jetons par ordre de priorité puis d'arrivée.
+    Les demandes attendent dans une file FIFO par (endpoint, priorité) : servir un
+    jeton ne regarde que la tête de chaque file, et le prochain réveil se calcule
+    d'après les buckets de chaque endpoint, pas en parcourant toutes les demandes
+    (un backfill peut en mettre des dizaines de milliers en attente).
+    """
+
+    def __init__(self, app_limits=None):
+        self.app_limits = list(app_limits or DEFAULT_APP_LIMITS)
+        self.app_buckets = _make_buckets(self.app_limits)
+        self.method_buckets = {}
+        self.method_limits = {}
+        self.app_blocked_until = 0.0
+        self.method_blocked_until = {}
+        # endpoint -> {priorité: deque[(seq, future)]}
+        self._lanes = {}
+        self._pending = 0
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+
+    @property
+    def queue_depth(self):
+        return self._pending
+
+    def _delay(self, method, now):
+        delay = max(self.app_blocked_until - now, self.method_blocked_until.get(method, 0.0) - now, 0.0)
+        for bucket in self.app_buckets + self.method_buckets.get(method, []):
+            delay = max(delay, bucket.delay(now))
+        return delay
+
+    def _consume(self, method, now):
+        for bucket in self.app_buckets + self.method_buckets.get(method, []):
+            bucket.consume(now)
+
+    async def acquire(self, method, priority=PRIORITY_INTERACTIVE):
+        """Attend qu'un jeton soit disponible pour `method` sur cet hôte."""
+        loop = asyncio.get_running_loop()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        fut = loop.create_future()
+        self._lanes.setdefault(method, {}).setdefault(priority, deque()).append((next(self._seq), fut))
+        self._pending += 1
+        # Servie ou annulée : elle ne compte plus dans la file
+        fut.add_done_callback(self._done)
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._dispatch())
+        self._wakeup.set()
+        await fut
+
+    def _done(self, fut):
+        self._pending -= 1
+
+    def _head(self, method):
+        """(priorité, seq, file) de la première demande en attente pour `method`, None si aucune."""
+        best = None
+        lanes = self._lanes[method]
+        for priority, lane in list(lanes.items()):
+            # Les demandes annulées entre-temps sont jetées quand elles arrivent en tête
+            while lane and lane[0][1].done():
+                lane.popleft()
+            if not lane:
+                del lanes[priority]
+                continue
+            if best is None or (priority, lane[0][0]) < best[:2]:
+                best = (priority, lane[0][0], lane)
+        if not lanes:
+            del self._lanes[method]
+        return best
+
+    async def _dispatch(self):
+        while True:
+            # Tête de chaque endpoint ; la première servable par priorité > ordre d'arrivée.
+            # Une requête bloquée par sa limite "method" ne bloque pas les autres endpoints
+            now = time.monotonic()
+            servable = None
+            next_delay = None
+            for method in list(self._lanes):
+                head = self._head(method)
+                if head is None:
+                    continue
+                delay = self._delay(method, now)
+                if delay <= 0:
+                    if servable is None or head[:2] < servable[0][:2]:
+                        servable = (head, method)
+                elif next_delay is None or delay < next_delay:
+                    next_delay = delay
+
+            if servable is not None:
+                (_, _, lane), method = servable
+                _, fut = lane.popleft()
+                self._consume(method, now)
+                fut.set_result(None)
+                await asyncio.sleep(0)
+                continue
+            if next_delay is None:
+                return
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), next_delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def update_from_headers(self, method, headers):
+        """Recale les buckets sur ce que Riot annonce dans la réponse."""
+        now = time.monotonic()
+
+        app_limits = parse_limits(headers.get('X-App-Rate-Limit'))
+        if app_limits and app_limits != self.app_limits:
+            self.app_limits = app_limits
+            self.app_buckets = _make_buckets(app_limits)
+        _sync_buckets(self.app_buckets, headers.get('X-App-Rate-Limit-Count'), now)
+
+        method_limits = parse_limits(headers.get('X-Method-Rate-Limit'))
+        if method_limits and method_limits != self.method_limits.get(method):
+            self.method_limits[method] = method_limits
+            self.method_buckets[method] = _make_buckets(method_limits)
+        _sync_buckets(self.method_buckets.get(method, []), headers.get('X-Method-Rate-Limit-Count'), now)
+
+    def block(self, method, retry_after, limit_type=None):
+        """Suite à un 429 : on bloque la portée concernée pendant Retry-After."""
+        until = time.monotonic() + retry_after
+        if limit_type == 'application':
+            self.app_blocked_until = max(self.app_blocked_until, until)
+        else:
+            # 'method' ou 'service' (limite côté Riot) : on ne bloque que l'endpoint
+            self.method_blocked_until[method] = max(self.method_blocked_until.get(method, 0.0), until)
@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+import PIL
+from PIL import Image, ImageDraw, ImageFont
+
+from leaderboard import APEX_TIER, LP_PER_TIER, RANK_VALUES, TIER_VALUES
+from perf import metrics
+
+ICON_SIZE = 80
+STAR_BAND_HEIGHT = 28  # bande au dessus des icônes pour les étoiles
+HEADER_HEIGHT = 30  # bandeau placement / durée de chaque game (image groupée)
+MIN_HISTORY_WIDTH = 400
+PROGRESS_SIZE = (800, 360)
+# Marges du graphe de !progress (libellés de rang à gauche, dates en bas)
+PROGRESS_MARGINS = (130, 20, 44, 36)
+# À incrémenter dès que le rendu change : invalide les images déjà en cache
+LAYOUT_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def _font(size):
+    # Police sûre : prefer builtin pillow test font (toujours présent)
+    try:
+        font_path = os.path.join(os.path.dirname(PIL.__file__), "Tests/fonts/FreeMono.ttf")
+        return ImageFont.truetype(font_path, size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def _tier_str(t):
+    t = max(1, min(3, int(t)))
+    return "*" * t
+
+
+def _draw_comp(final_img, draw, icons, tiers, x0, y0, size, font):
+    """Dessine une compo (bande d'étoiles + icônes) à partir de (x0, y0)."""
+    for idx, raw in enumerate(icons):
+        champ_img = Image.frombytes("RGBA", (size, size), raw)
+        x = x0 + idx * size
+        stars = _tier_str(tiers[idx])
+
+        # Mesure du texte avec textbbox (compat Pillow 10+)
+        bbox = draw.textbbox((0, 0), stars, font=font)
+        text_w = bbox[2] - bbox[0]
+        text_h = bbox[3] - bbox[1]
+        tx = x + (size - text_w) // 2
+        ty = y0 + (STAR_BAND_HEIGHT - text_h) // 2
+
+        # contour noir (4 directions) + texte blanc
+        draw.text((tx + 1, ty + 1), stars, fill=(0, 0, 0), font=font)
+        draw.text((tx - 1, ty + 1), stars, fill=(0, 0, 0), font=font)
+        draw.text((tx + 1, ty - 1), stars, fill=(0, 0, 0), font=font)
+        draw.text((tx - 1, ty - 1), stars, fill=(0, 0, 0), font=font)
+        draw.text((tx, ty), stars, fill=(255, 255, 255), font=font)
+
+        final_img.paste(champ_img, (x, y0 + STAR_BAND_HEIGHT), champ_img)
+
+
+def _to_png(img):
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def render_comp(icons, tiers, size=ICON_SIZE):
+    """
+    Rendu de l'image compacte d'une compo (étoiles en '*'), en PNG.
+    Fonction pure (pas d'I/O) pour tourner dans un worker : `icons` sont les
+    pixels RGBA bruts des icônes size x size (Image.tobytes()), `tiers` leurs étoiles.
+    """
+    if not icons:
+        return None
+
+    width = size * len(icons)
+    height = STAR_BAND_HEIGHT + size
+    final_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(final_img)
+    _draw_comp(final_img, draw, icons, tiers, 0, 0, size, _font(14))
+    return _to_png(final_img)
+
+
+def _placement_color(placement):
+    if placement == 1:
+        return (241, 196, 15)
+    if 1 <= placement <= 4:
+        return (46, 204, 113)
+    return (231, 76, 60)
+
+
+def render_history(rows, size=ICON_SIZE):
+    """
+    Toutes les games dans une seule image : pour chaque ligne, un bandeau
+    (placement + durée) puis la compo. `rows` : [(titre, placement, icons, tiers)],
+    avec les icônes en pixels RGBA bruts comme pour render_comp.
+    """
+    if not rows:
+        return None
+
+    row_height = HEADER_HEIGHT + STAR_BAND_HEIGHT + size
+    width = max(MIN_HISTORY_WIDTH, max(size * len(icons) for _, _, icons, _ in rows))
+    final_img = Image.new("RGBA", (width, row_height * len(rows)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(final_img)
+    header_font = _font(18)
+    star_font = _font(14)
+
+    for i, (title, placement, icons, tiers) in enumerate(rows):
+        y = i * row_height
+        draw.rectangle((0, y, width, y + HEADER_HEIGHT - 1), fill=(32, 34, 37, 255))
+        draw.rectangle((0, y, 5, y + HEADER_HEIGHT - 1), fill=_placement_color(placement))
+        bbox = draw.textbbox((0, 0), title, font=header_font)
+        draw.text((12, y + (HEADER_HEIGHT - (bbox[3] - bbox[1])) // 2 - bbox[1]), title,
+                  fill=(255, 255, 255), font=header_font)
+        _draw_comp(final_img, draw, icons, tiers, 0, y + HEADER_HEIGHT, size, star_font)
+
+    return _to_png(final_img)
+
+
+_TIERS = [t for t in TIER_VALUES if t != 'UNRANKED']
+_DIVISIONS = sorted(RANK_VALUES, key=RANK_VALUES.get)
+_APEX_LP = (TIER_VALUES[APEX_TIER] // 100 - 1) * LP_PER_TIER
+
+
+def _ladder_label(value):
+    """LP cumulés (cf. leaderboard.ladder_lp) -> "GOLD II", ou "MASTER+ 120 LP"."""
+    if value >= _APEX_LP:
+        return f"{APEX_TIER}+ {value - _APEX_LP} LP"
+    return f"{_TIERS[value // LP_PER_TIER]} {_DIVISIONS[value % LP_PER_TIER // 100]}"
+
+
+def render_progress(title, timestamps, values, size=PROGRESS_SIZE):
+    """
+    Courbe de progression d'un joueur, en PNG. Fonction pure comme render_comp :
+    `timestamps` (secondes) et `values` (LP cumulés, leaderboard.ladder_lp) sont
+    deux listes de même longueur triées par date.
+    """
+    if not values:
+        return None
+
+    width, height = size
+    left, right, top, bottom = PROGRESS_MARGINS
+    img = Image.new("RGBA", size, (32, 34, 37, 255))
+    draw = ImageDraw.Draw(img)
+    font = _font(14)
+    draw.text((left, 10), title, fill=(255, 255, 255), font=_font(18))
+
+    # Axe des LP : une ligne par division, ou par tier (voire plus) si la courbe est haute
+    span = max(values) - min(values)
+    step = 100 if span <= 800 else LP_PER_TIER * max(1, -(-span // (LP_PER_TIER * 10)))
+    lo = min(values) // step * step
+    hi = max(lo + step, -(-max(values) // step) * step)
+    t0, t1 = timestamps[0], max(timestamps[-1], timestamps[0] + 1)
+
+    def x(t):
+        return left + (t - t0) * (width - left - right) / (t1 - t0)
+
+    def y(v):
+        return top + (hi - v) * (height - top - bottom) / (hi - lo)
+
+    for v in range(lo, hi + 1, step):
+        draw.line((left, y(v), width - right, y(v)), fill=(64, 68, 75))
+        label = _ladder_label(v)
+        bbox = draw.textbbox((0, 0), label, font=font)
+        draw.text((left - 8 - (bbox[2] - bbox[0]), y(v) - (bbox[3] - bbox[1]) // 2 - bbox[1]), label,
+                  fill=(185, 187, 190), font=font)
+
+    for t in (t0, (t0 + t1) / 2, t1):
+        label = datetime.fromtimestamp(t).strftime("%d/%m %Hh")
+        bbox = draw.textbbox((0, 0), label, font=font)
+        tx = min(max(left, x(t) - (bbox[2] - bbox[0]) / 2), width - right - (bbox[2] - bbox[0]))
+        draw.text((tx, height - bottom + 10), label, fill=(185, 187, 190), font=font)
+
+    points = [(x(t), y(v)) for t, v in zip(timestamps, values)]
+    if len(points) > 1:
+        draw.line(points, fill=(52, 152, 219), width=3, joint="curve")
+    px, py = points[-1]
+    draw.ellipse((px - 4, py - 4, px + 4, py + 4), fill=(241, 196, 15))
+
+    return _to_png(img)
+
+
+class Renderer:
+    """
+    Exécute les rendus Pillow dans un pool (threads ou processus) pour que
+    la loop asyncio (heartbeat Discord, autres commandes) ne soit jamais bloquée.
+    """
+
+    def __init__(self, mode="thread", workers=2):
+        self.mode = mode
+        self.workers = workers
+        if mode == "process":
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        # Attente d'un worker libre comprise : c'est ce que voit la commande
+        with metrics.timer('render_seconds', kind=fn.__name__):
+            return await loop.run_in_executor(self._pool, fn, *args)
+
+    async def render_comp(self, icons, tiers):
+        """`icons` : Images RGBA déjà redimensionnées (cf. IconCache)."""
+        raws = [img.tobytes() for img in icons]
+        return await self.run(render_comp, raws, tiers, ICON_SIZE)
+
+    async def render_history(self, rows):
+        """`rows` : [(titre, placement, Images RGBA, tiers)], une ligne par game."""
+        raw_rows = [
+            (title, placement, [img.tobytes() for img in icons], tiers)
+            for title, placement, icons, tiers in rows
+        ]
+        return await self.run(render_history, raw_rows, ICON_SIZE)
+
+    async def render_progress(self, title, timestamps, values):
+        return await self.run(render_progress, title, list(timestamps), list(values))
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RenderCache:
+    """
+    PNG déjà rendus, par (layout, match_id(s), puuid) : une compo d'une partie
+    terminée ne change jamais. LRU borné en octets en mémoire ; tout est aussi
+    écrit sur disque, où l'on retombe après une éviction ou un redémarrage.
+    """
+
+    def __init__(self, cache_dir, max_bytes=32 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def key(layout, match_ids, puuid):
+        raw = f"{layout}:v{LAYOUT_VERSION}:{puuid}:{','.join(match_ids)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _remember(self, key, png):
+        if key in self._cache:
+            self._bytes -= len(self._cache.pop(key))
+        self._cache[key] = png
+        self._bytes += len(png)
+        while self._bytes > self.max_bytes and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self._bytes -= len(old)
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, png):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, self._path(key))
+
+    async def get(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            metrics.inc('cache_requests_total', cache='render', result='memory')
+            return self._cache[key]
+        png = await asyncio.to_thread(self._read_disk, key)
+        metrics.inc('cache_requests_total', cache='render', result='disk' if png is not None else 'miss')
+        if png is not None:
+            self._remember(key, png)
+        return png
+
+    async def put(self, key, png):
+        self._remember(key, png)
+        await asyncio.to_thread(self._write_disk, key, png)
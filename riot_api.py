@@ -0,0 +1,431 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+import aiohttp
+
+from match_store import MatchRecord
+from perf import metrics
+from ratelimit import PRIORITY_INTERACTIVE, RateLimiter
+
+# Hôtes Riot : "routing" régional pour account/match, plateforme pour league
+ROUTING = 'europe'
+REGION = 'euw1'
+# Plateforme d'un joueur -> cluster régional qui sert ses matchs
+PLATFORM_ROUTING = {
+    'euw1': 'europe', 'eun1': 'europe', 'tr1': 'europe', 'ru': 'europe', 'me1': 'europe',
+    'na1': 'americas', 'br1': 'americas', 'la1': 'americas', 'la2': 'americas',
+    'kr': 'asia', 'jp1': 'asia',
+    'oc1': 'sea', 'ph2': 'sea', 'sg2': 'sea', 'th2': 'sea', 'tw2': 'sea', 'vn2': 'sea',
+}
+# account-v1 n'existe pas sur "sea" : les comptes SEA passent par "asia"
+ACCOUNT_ROUTING = {'sea': 'asia'}
+# Ce que tapent les joueurs ("EUW", "NA"...) -> plateforme
+PLATFORM_ALIASES = {
+    'euw': 'euw1', 'eune': 'eun1', 'tr': 'tr1', 'ru': 'ru', 'me': 'me1',
+    'na': 'na1', 'br': 'br1', 'lan': 'la1', 'las': 'la2',
+    'kr': 'kr', 'jp': 'jp1',
+    'oce': 'oc1', 'ph': 'ph2', 'sg': 'sg2', 'th': 'th2', 'tw': 'tw2', 'vn': 'vn2',
+}
+# Modèle d'URL d'un hôte Riot ({host} = routing ou plateforme) ; à changer pour viser
+# un serveur local (cf. mock_riot.py), ex. 'http://127.0.0.1:8080/{host}'
+RIOT_BASE_URL = 'https://{host}.api.riotgames.com'
+
+# Relances sur 429 / 5xx / erreurs réseau avant d'abandonner
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+# Disjoncteur par (hôte, endpoint) : ouvert après CIRCUIT_THRESHOLD échecs d'affilée
+# (5xx / réseau), pendant CIRCUIT_COOLDOWN secondes
+CIRCUIT_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 30
+# Derniers IDs de matchs connus gardés par joueur (réponse de secours, cf. last_match_ids)
+LAST_MATCH_IDS = 100
+
+
+def parse_platform(text):
+    """'EUW', 'euw1', 'NA'... -> plateforme Riot ('euw1', 'na1'...), None si inconnue."""
+    key = (text or '').strip().lower()
+    if key in PLATFORM_ROUTING:
+        return key
+    return PLATFORM_ALIASES.get(key)
+
+
+def platform_label(platform):
+    """'euw1' -> 'EUW' (nom affiché aux joueurs)."""
+    for alias, p in PLATFORM_ALIASES.items():
+        if p == platform:
+            return alias.upper()
+    return (platform or '').upper()
+
+
+def match_platform(match_id):
+    """Plateforme d'un match d'après son ID ('EUW1_123' -> 'euw1'), None si inconnue."""
+    prefix = match_id.split('_', 1)[0].lower()
+    return prefix if prefix in PLATFORM_ROUTING else None
+
+
+class RiotAPIError(Exception):
+    """L'API Riot n'a pas pu répondre (rate-limit ou panne), à ne pas confondre avec "introuvable"."""
+
+    def __init__(self, status, url):
+        super().__init__(f"Riot API {status} sur {url}")
+        self.status = status
+        self.url = url
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur d'un endpoint Riot sur un hôte : après `threshold` échecs d'affilée
+    (5xx, réseau), les appels échouent tout de suite pendant `cooldown` secondes au
+    lieu de charger un hôte en panne. Ensuite une requête d'essai passe (une par
+    cooldown) : réponse -> refermé, échec -> rouvert. Un 429 ou un 404 est une réponse :
+    l'hôte est joignable, c'est le limiteur qui gère le débit.
+    """
+
+    def __init__(self, threshold=CIRCUIT_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        # Demi-ouvert : une seule requête d'essai à la fois (reprise si elle n'a jamais abouti)
+        now = time.monotonic()
+        if self._probe_at is not None and now - self._probe_at < self.cooldown:
+            return False
+        self._probe_at = now
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def failure(self):
+        """Renvoie True si cet échec (ouv)re le disjoncteur."""
+        self.failures += 1
+        if self._probe_at is not None or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self._probe_at = None
+            return True
+        return False
+
+
+class RiotClient:
+    """
+    Client HTTP unique pour l'API Riot (et CommunityDragon), créé au démarrage
+    du bot et partagé par toutes les commandes.
+    Chaque hôte Riot (plateforme euw1, na1... ou cluster europe, americas...) a sa
+    propre session keep-alive et son propre limiteur : un roster multi-régions
+    est interrogé en parallèle sur tous les hôtes, sans qu'une région saturée
+    ne bloque les autres. `region` est la plateforme par défaut des joueurs.
+    Chaque endpoint d'un hôte a aussi son disjoncteur (CircuitBreaker) : un hôte
+    en panne renvoie RiotAPIError tout de suite au lieu d'être relancé en boucle.
+    """
+
+    def __init__(self, api_key, region=REGION, routing=ROUTING,
+                 pool_size=100, pool_size_per_host=20, timeout=10, match_store=None,
+                 league_ttl=30, base_url=RIOT_BASE_URL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.region = region
+        self.routing = routing
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.timeout = timeout
+        # Les matchs terminés ne changent plus : on les garde (cf. MatchStore)
+        self.match_store = match_store
+        # get_league : cache court (puuid -> (expiration, entry)) + requêtes en vol partagées
+        # (puuid -> (tâche, priorité))
+        self.league_ttl = league_ttl
+        self._league_cache = {}
+        self._league_inflight = {}
+        # Session "générale" (CommunityDragon), puis une session par hôte Riot
+        self._session = None
+        self._host_sessions = {}
+        # Un limiteur par hôte Riot (les limites sont comptées par hôte)
+        self._limiters = {}
+        # Un disjoncteur par (hôte, endpoint)
+        self._breakers = {}
+        # Derniers IDs de matchs reçus par puuid (les plus récents d'abord)
+        self._last_match_ids = {}
+
+    def _new_session(self, limit, limit_per_host):
+        connector = aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    async def start(self):
+        if self._session is not None and not self._session.closed:
+            return
+        self._session = self._new_session(self.pool_size, self.pool_size_per_host)
+
+    async def close(self):
+        sessions = [self._session, *self._host_sessions.values()]
+        for session in sessions:
+            if session is not None and not session.closed:
+                await session.close()
+        self._session = None
+        self._host_sessions = {}
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            raise RuntimeError("RiotClient non démarré : appelle start() d'abord.")
+        return self._session
+
+    def session_for(self, host):
+        """Session (pool de connexions) dédiée à un hôte Riot, créée au premier appel."""
+        if self._session is None or self._session.closed:
+            raise RuntimeError("RiotClient non démarré : appelle start() d'abord.")
+        session = self._host_sessions.get(host)
+        if session is None or session.closed:
+            session = self._host_sessions[host] = self._new_session(self.pool_size_per_host, self.pool_size_per_host)
+        return session
+
+    def platform(self, platform=None):
+        return platform or self.region
+
+    def routing_for(self, platform=None):
+        """Cluster régional (account / match) d'une plateforme."""
+        return PLATFORM_ROUTING.get(self.platform(platform), self.routing)
+
+    def _url(self, host, path):
+        return self.base_url.format(host=host) + path
+
+    def limiter(self, host):
+        if host not in self._limiters:
+            self._limiters[host] = RateLimiter()
+        return self._limiters[host]
+
+    def breaker(self, host, method):
+        key = (host, method)
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker()
+        return self._breakers[key]
+
+    def open_circuits(self):
+        """[(hôte, endpoint)] dont le disjoncteur n'est pas fermé."""
+        return [key for key, breaker in self._breakers.items() if breaker.state != "closed"]
+
+    def _failure(self, breaker, host, method):
+        if breaker.failure():
+            metrics.inc('riot_circuit_opened_total', host=host, endpoint=method)
+
+    @property
+    def queue_depth(self):
+        return sum(limiter.queue_depth for limiter in self._limiters.values())
+
+    @staticmethod
+    def _backoff(attempt):
+        # Backoff exponentiel + jitter pour ne pas relancer tous en même temps
+        return RETRY_BASE_DELAY * 2 ** attempt + random.uniform(0, RETRY_BASE_DELAY)
+
+    async def _get_json(self, host, path, method, params=None, priority=PRIORITY_INTERACTIVE):
+        """
+        GET via le limiteur de l'hôte (routing ou plateforme). Renvoie le JSON, None sur
+        un 404 (joueur / match introuvable) et lève RiotAPIError si Riot reste indisponible.
+        """
+        # Durée totale vue par l'appelant : attente du limiteur + requêtes + relances
+        with metrics.timer('riot_call_seconds', endpoint=method):
+            return await self._request(host, path, method, params, priority)
+
+    async def _request(self, host, path, method, params, priority):
+        url = self._url(host, path)
+        limiter = self.limiter(host)
+        breaker = self.breaker(host, method)
+        query = {'api_key': self.api_key}
+        if params:
+            query.update(params)
+
+        status = None
+        for attempt in range(MAX_RETRIES + 1):
+            if not breaker.allow():
+                # Hôte en panne pour cet endpoint : échec immédiat, sans requête
+                metrics.inc('riot_responses_total', endpoint=method, status='circuit_open')
+                raise RiotAPIError('circuit_open', url)
+            metrics.peak('riot_queue_depth', limiter.queue_depth + 1, host=host)
+            with metrics.timer('riot_ratelimit_wait_seconds', endpoint=method):
+                await limiter.acquire(method, priority)
+            try:
+                with metrics.timer('riot_request_seconds', endpoint=method):
+                    async with self.session_for(host).get(url, params=query) as resp:
+                        status = resp.status
+                        metrics.inc('riot_responses_total', endpoint=method, status=status)
+                        if status in RETRYABLE_STATUSES:
+                            self._failure(breaker, host, method)
+                        else:
+                            breaker.success()
+                        limiter.update_from_headers(method, resp.headers)
+                        if status == 200:
+                            return await resp.json()
+                        if status == 404:
+                            return None
+                        if status == 429:
+                            retry_after = float(resp.headers.get('Retry-After', 1))
+                            limiter.block(method, retry_after, resp.headers.get('X-Rate-Limit-Type'))
+                            continue
+                        if status not in RETRYABLE_STATUSES:
+                            break
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 'network'
+                metrics.inc('riot_responses_total', endpoint=method, status=status)
+                self._failure(breaker, host, method)
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(self._backoff(attempt))
+
+        raise RiotAPIError(status, url)
+
+    async def get_uuid(self, name, tag, platform=None, priority=PRIORITY_INTERACTIVE):
+        routing = self.routing_for(platform)
+        data = await self._get_json(
+            ACCOUNT_ROUTING.get(routing, routing), f'/riot/account/v1/accounts/by-riot-id/{name}/{tag}',
+            'account-by-riot-id', priority=priority,
+        )
+        if data:
+            return data.get('puuid')
+        return None
+
+    async def get_league(self, uuid, platform=None, priority=PRIORITY_INTERACTIVE):
+        """
+        Entrée RANKED_TFT du joueur. Réutilisée pendant `league_ttl` secondes, et les
+        appels simultanés pour le même puuid attendent une seule requête Riot.
+        """
+        cached = self._league_cache.get(uuid)
+        if cached is not None and cached[0] > time.monotonic():
+            metrics.inc('cache_requests_total', cache='league', result='hit')
+            return cached[1]
+
+        task, task_priority = self._league_inflight.get(uuid, (None, None))
+        if task is None or priority < task_priority:
+            # Requête de fond en cours pour un appelant interactif : elle peut attendre
+            # longtemps derrière les autres dans le limiteur, on la relance en interactif
+            # (les appelants déjà en attente gardent la leur, qui remplira aussi le cache)
+            metrics.inc('cache_requests_total', cache='league', result='miss' if task is None else 'bumped')
+            task = asyncio.ensure_future(self._fetch_league(uuid, platform, priority))
+            self._league_inflight[uuid] = (task, priority)
+            task.add_done_callback(lambda t: self._league_done(uuid, t))
+        else:
+            metrics.inc('cache_requests_total', cache='league', result='shared')
+        # shield : un appelant annulé n'annule pas la requête des autres
+        return await asyncio.shield(task)
+
+    def _league_done(self, uuid, task):
+        # Une requête remplacée par une relance interactive ne retire pas celle-ci
+        if self._league_inflight.get(uuid, (None,))[0] is task:
+            del self._league_inflight[uuid]
+
+    async def _fetch_league(self, uuid, platform, priority):
+        data = await self._get_json(
+            self.platform(platform), f'/tft/league/v1/by-puuid/{uuid}',
+            'league-by-puuid', priority=priority,
+        )
+        league = None
+        for entry in data or []:
+            if entry['queueType'] == 'RANKED_TFT':
+                league = entry
+                break
+        self._league_cache[uuid] = (time.monotonic() + self.league_ttl, league)
+        return league
+
+    async def get_match_ids(self, uuid, count=5, start=0, platform=None, priority=PRIORITY_INTERACTIVE):
+        params = {'count': count}
+        if start:
+            params['start'] = start
+        data = await self._get_json(
+            self.routing_for(platform), f'/tft/match/v1/matches/by-puuid/{uuid}/ids',
+            'match-ids-by-puuid', params, priority,
+        )
+        if data and not start:
+            known = self._last_match_ids.get(uuid, [])
+            self._last_match_ids[uuid] = (data + [mid for mid in known if mid not in data])[:LAST_MATCH_IDS]
+        return data or []
+
+    def last_match_ids(self, uuid, count=5):
+        """Derniers IDs de matchs reçus pour ce joueur (sans appel), à défaut d'une réponse à temps."""
+        return self._last_match_ids.get(uuid, [])[:count]
+
+    async def get_match_data(self, match_id, priority=PRIORITY_INTERACTIVE):
+        """
+        MatchRecord (forme compacte) du match : le JSON Riot complet est réduit
+        dès la réception et n'est jamais gardé.
+        """
+        if self.match_store is not None:
+            record = await self.match_store.get(match_id)
+            if record is not None:
+                return record
+        # Le préfixe de l'ID ("NA1_...") donne le cluster qui sert le match
+        data = await self._get_json(
+            self.routing_for(match_platform(match_id)), f'/tft/match/v1/matches/{match_id}',
+            'match-by-id', priority=priority,
+        )
+        if data is None:
+            return None
+        record = MatchRecord.from_riot(match_id, data)
+        if self.match_store is not None:
+            await self.match_store.put(match_id, record)
+        return record
+
+    async def iter_matches(self, match_ids, concurrency=5, priority=PRIORITY_INTERACTIVE):
+        """
+        Génère (match_id, data) dans l'ordre de `match_ids`, avec jusqu'à `concurrency`
+        requêtes en avance. Si l'appelant s'arrête (à utiliser avec contextlib.aclosing),
+        les requêtes encore en vol sont annulées.
+        """
+        pending = deque()
+        ids = iter(match_ids)
+
+        def schedule(limit):
+            if len(pending) >= limit:
+                return
+            for match_id in ids:
+                pending.append((match_id, asyncio.ensure_future(self.get_match_data(match_id, priority=priority))))
+                if len(pending) >= limit:
+                    break
+
+        try:
+            schedule(concurrency)
+            while pending:
+                match_id, task = pending.popleft()
+                # la requête qu'on attend compte dans la fenêtre
+                schedule(concurrency - 1)
+                yield match_id, await task
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def get_bytes(self, url):
+        """Téléchargement brut (icônes CommunityDragon), None si échec."""
+        try:
+            with metrics.timer('riot_request_seconds', endpoint='cdragon'):
+                async with self.session.get(url) as resp:
+                    metrics.inc('riot_responses_total', endpoint='cdragon', status=resp.status)
+                    if resp.status != 200:
+                        return None
+                    return await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            metrics.inc('riot_responses_total', endpoint='cdragon', status='network')
+            return None
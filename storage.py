@@ -0,0 +1,467 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from perf import metrics
+
+# Plateforme Riot des joueurs ajoutés avant le multi-régions (tous sur EUW)
+LEGACY_PLATFORM = 'euw1'
+# Serveur Discord des joueurs ajoutés avant les rosters par serveur (à rattacher, cf. move_guild)
+LEGACY_GUILD = 0
+# Taille des paquets de puuids dans les requêtes "IN (...)" (limite de variables SQLite)
+SQL_CHUNK = 500
+
+
+def name_key(name):
+    """Clé de recherche d'un pseudo (insensible à la casse)."""
+    return name.strip().casefold()
+
+
+def riot_id_key(name, tag):
+    """Clé d'un Riot ID "pseudo#tag" (insensible à la casse, comme chez Riot)."""
+    return f"{name_key(name)}#{tag.strip().casefold()}"
+
+
+def _chunks(items, size=SQL_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class Storage:
+    """
+    Stockage des joueurs suivis et du cache de stats de compos dans SQLite (WAL).
+    Un compte Riot (puuid) n'est stocké qu'une fois, et la table guild_players
+    dit quels serveurs Discord le suivent, sous quel pseudo (propre à chaque
+    serveur). Les leagues sont aussi gardées ici pour être partagées entre
+    serveurs et entre process (shards), ainsi que les Riot ID déjà résolus
+    (pseudo#tag -> puuid).
+    Index sur le pseudo normalisé et sur le puuid, écritures transactionnelles,
+    et tous les accès passent par un thread pour ne pas bloquer la loop.
+    Au premier lancement, on reprend le contenu de players.json / stats.json.
+    """
+
+    def __init__(self, path, players_json=None, stats_json=None):
+        self.path = path
+        self.players_json = players_json
+        self.stats_json = stats_json
+        self._conn = None
+        self._lock = threading.Lock()
+
+    # ---------- Connexion / schéma ----------
+
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Plusieurs process (shards) peuvent écrire dans la même base
+            conn.execute("PRAGMA busy_timeout=5000")
+            with conn:
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS players (
+                        id INTEGER PRIMARY KEY,
+                        puuid TEXT NOT NULL UNIQUE,
+                        name TEXT NOT NULL,
+                        name_key TEXT NOT NULL,
+                        platform TEXT NOT NULL DEFAULT 'euw1'
+                    );
+                    CREATE INDEX IF NOT EXISTS players_name_key ON players (name_key);
+                    CREATE TABLE IF NOT EXISTS guild_players (
+                        guild_id INTEGER NOT NULL,
+                        puuid TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        name_key TEXT NOT NULL,
+                        PRIMARY KEY (guild_id, puuid)
+                    );
+                    CREATE INDEX IF NOT EXISTS guild_players_puuid ON guild_players (puuid);
+                    CREATE UNIQUE INDEX IF NOT EXISTS guild_players_name ON guild_players (guild_id, name_key);
+                    CREATE TABLE IF NOT EXISTS stats (
+                        puuid TEXT PRIMARY KEY,
+                        data TEXT NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS leagues (
+                        puuid TEXT PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        fetched_at REAL NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS riot_ids (
+                        riot_id TEXT PRIMARY KEY,
+                        puuid TEXT NOT NULL,
+                        resolved_at REAL NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL
+                    );
+                """)
+            self._conn = conn
+            self._migrate_schema()
+            self._migrate_json()
+            self._migrate_guilds()
+        return self._conn
+
+    def _migrate_schema(self):
+        """Ajoute les colonnes apparues depuis la création de la base."""
+        conn = self._conn
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(players)")}
+        if 'platform' not in columns:
+            with conn:
+                conn.execute(
+                    f"ALTER TABLE players ADD COLUMN platform TEXT NOT NULL DEFAULT '{LEGACY_PLATFORM}'"
+                )
+
+    def _migrate_json(self):
+        """Import unique des anciens fichiers JSON (laissés en place)."""
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        with conn:
+            if self.players_json and os.path.exists(self.players_json):
+                with open(self.players_json, 'r', encoding='utf-8') as f:
+                    players = json.load(f).get('players', [])
+                for p in players:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO players (puuid, name, name_key, platform) VALUES (?, ?, ?, ?)",
+                        (p['uuid'], p['name'], name_key(p['name']), LEGACY_PLATFORM)
+                    )
+            if self.stats_json and os.path.exists(self.stats_json):
+                with open(self.stats_json, 'r', encoding='utf-8') as f:
+                    all_stats = json.load(f)
+                for puuid, data in all_stats.items():
+                    conn.execute(
+                        "INSERT OR REPLACE INTO stats (puuid, data) VALUES (?, ?)",
+                        (puuid, json.dumps(data, ensure_ascii=False))
+                    )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+    def _migrate_guilds(self):
+        """L'ancien roster global devient celui de LEGACY_GUILD, en attendant d'être rattaché."""
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'guilds_migrated'").fetchone():
+            return
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO guild_players (guild_id, puuid, name, name_key) "
+                "SELECT ?, puuid, name, name_key FROM players ORDER BY id",
+                (LEGACY_GUILD,)
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('guilds_migrated', '1')")
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(self._db(), *args)
+
+    async def _call(self, fn, *args):
+        # op = méthode appelante (ex. "Storage.get_stats.<locals>.q" -> "get_stats")
+        op = fn.__qualname__.split('.<locals>')[0].rsplit('.', 1)[-1]
+        with metrics.timer('storage_seconds', op=op):
+            return await asyncio.to_thread(self._run, fn, *args)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- Joueurs ----------
+
+    @staticmethod
+    def _player(row):
+        if not row:
+            return None
+        return {'name': row['name'], 'uuid': row['puuid'], 'platform': row['platform']}
+
+    @staticmethod
+    def _drop_orphans(db):
+        # Un compte qui n'est plus suivi par aucun serveur (ses stats restent en cache)
+        db.execute("DELETE FROM players WHERE puuid NOT IN (SELECT puuid FROM guild_players)")
+
+    async def load_players(self):
+        """[(guild_id, joueur)] de tous les serveurs, dans l'ordre d'ajout."""
+        def q(db):
+            return [(r['guild_id'], self._player(r)) for r in db.execute(
+                "SELECT g.guild_id, g.name, p.puuid, p.platform FROM guild_players g "
+                "JOIN players p ON p.puuid = g.puuid ORDER BY g.rowid"
+            )]
+        return await self._call(q)
+
+    async def find_player(self, guild_id, name):
+        def q(db):
+            return self._player(db.execute(
+                "SELECT g.name, p.puuid, p.platform FROM players p "
+                "JOIN guild_players g ON g.puuid = p.puuid WHERE g.guild_id = ? AND g.name_key = ?",
+                (guild_id, name_key(name))
+            ).fetchone())
+        return await self._call(q)
+
+    async def add_player(self, guild_id, name, uuid, platform=LEGACY_PLATFORM):
+        """
+        Le pseudo est propre au serveur : les autres serveurs qui suivent le même
+        compte gardent le leur (seule la plateforme, donnée du compte, est mise à jour).
+        """
+        def q(db):
+            with db:
+                db.execute(
+                    "INSERT INTO players (puuid, name, name_key, platform) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (puuid) DO UPDATE SET platform = excluded.platform",
+                    (uuid, name, name_key(name), platform)
+                )
+                db.execute(
+                    "INSERT INTO guild_players (guild_id, puuid, name, name_key) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (guild_id, puuid) DO UPDATE SET name = excluded.name, name_key = excluded.name_key",
+                    (guild_id, uuid, name, name_key(name))
+                )
+        await self._call(q)
+
+    async def add_players(self, guild_id, players):
+        """Ajoute [{'name', 'uuid', 'platform'}] au serveur en une seule transaction (cf. add_player)."""
+        def q(db):
+            with db:
+                db.executemany(
+                    "INSERT INTO players (puuid, name, name_key, platform) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (puuid) DO UPDATE SET platform = excluded.platform",
+                    [(p['uuid'], p['name'], name_key(p['name']), p['platform']) for p in players]
+                )
+                db.executemany(
+                    "INSERT INTO guild_players (guild_id, puuid, name, name_key) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (guild_id, puuid) DO UPDATE SET name = excluded.name, name_key = excluded.name_key",
+                    [(guild_id, p['uuid'], p['name'], name_key(p['name'])) for p in players]
+                )
+        await self._call(q)
+
+    async def remove_player(self, guild_id, uuid):
+        """Retire le joueur du serveur, renvoie False s'il n'y était pas suivi."""
+        def q(db):
+            with db:
+                removed = db.execute(
+                    "DELETE FROM guild_players WHERE guild_id = ? AND puuid = ?", (guild_id, uuid)
+                ).rowcount > 0
+                self._drop_orphans(db)
+                return removed
+        return await self._call(q)
+
+    async def remove_all_players(self, guild_id):
+        def q(db):
+            with db:
+                db.execute("DELETE FROM guild_players WHERE guild_id = ?", (guild_id,))
+                self._drop_orphans(db)
+        await self._call(q)
+
+    async def move_guild(self, old_guild_id, new_guild_id):
+        """Rattache tout le roster d'un serveur à un autre (ex. l'ancien roster global)."""
+        def q(db):
+            with db:
+                db.execute(
+                    "UPDATE OR IGNORE guild_players SET guild_id = ? WHERE guild_id = ?",
+                    (new_guild_id, old_guild_id)
+                )
+                db.execute("DELETE FROM guild_players WHERE guild_id = ?", (old_guild_id,))
+        await self._call(q)
+
+    # ---------- Cache de stats de compos ----------
+
+    async def get_stats(self, puuid):
+        def q(db):
+            row = db.execute("SELECT data FROM stats WHERE puuid = ?", (puuid,)).fetchone()
+            return json.loads(row['data']) if row else None
+        return await self._call(q)
+
+    async def save_stats(self, puuid, data):
+        def q(db):
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO stats (puuid, data) VALUES (?, ?)",
+                    (puuid, json.dumps(data, ensure_ascii=False))
+                )
+        await self._call(q)
+
+    # ---------- Leagues partagées ----------
+
+    async def get_leagues(self, puuids, max_age=None):
+        """{puuid: league} des leagues stockées (None = non classé), plus récentes que `max_age` s."""
+        def q(db):
+            min_fetched = time.time() - max_age if max_age is not None else 0
+            leagues = {}
+            for chunk in _chunks(list(puuids)):
+                rows = db.execute(
+                    f"SELECT puuid, data FROM leagues WHERE fetched_at >= ? "
+                    f"AND puuid IN ({','.join('?' * len(chunk))})",
+                    (min_fetched, *chunk)
+                )
+                for row in rows:
+                    leagues[row['puuid']] = json.loads(row['data'])
+            return leagues
+        return await self._call(q)
+
+    async def save_leagues(self, leagues):
+        """Enregistre {puuid: league} en une transaction."""
+        def q(db):
+            now = time.time()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO leagues (puuid, data, fetched_at) VALUES (?, ?, ?)",
+                    [(puuid, json.dumps(league), now) for puuid, league in leagues.items()]
+                )
+        await self._call(q)
+
+
+    # ---------- Riot ID résolus ----------
+
+    async def get_riot_ids(self, riot_ids, max_age=None):
+        """{riot_id: puuid} des Riot ID (cf. riot_id_key) déjà résolus depuis moins de `max_age` s."""
+        def q(db):
+            min_resolved = time.time() - max_age if max_age is not None else 0
+            found = {}
+            for chunk in _chunks(list(riot_ids)):
+                rows = db.execute(
+                    f"SELECT riot_id, puuid FROM riot_ids WHERE resolved_at >= ? "
+                    f"AND riot_id IN ({','.join('?' * len(chunk))})",
+                    (min_resolved, *chunk)
+                )
+                for row in rows:
+                    found[row['riot_id']] = row['puuid']
+            return found
+        return await self._call(q)
+
+    async def save_riot_ids(self, riot_ids):
+        """Enregistre {riot_id: puuid} en une transaction."""
+        def q(db):
+            now = time.time()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO riot_ids (riot_id, puuid, resolved_at) VALUES (?, ?, ?)",
+                    [(riot_id, puuid, now) for riot_id, puuid in riot_ids.items()]
+                )
+        await self._call(q)
+
+
+class PlayerRegistry:
+    """
+    Joueurs suivis gardés en mémoire, par serveur Discord : chargés une fois au
+    démarrage, indexés par (serveur, pseudo normalisé) et par puuid. Un compte
+    suivi sur plusieurs serveurs n'existe qu'une fois : sa league, ses matchs et
+    ses compos ne sont récupérés qu'une fois pour tous. Chaque serveur a sa
+    propre entrée {'name', 'uuid', 'platform'} : le pseudo est celui choisi
+    par ce serveur. Les modifications sont écrites dans Storage avant d'être
+    appliquées en mémoire.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._players = {}
+        self._guilds = {}
+        self._names = {}
+
+    async def load(self):
+        self._players.clear()
+        self._guilds.clear()
+        self._names.clear()
+        for guild_id, p in await self.storage.load_players():
+            self._index(guild_id, p)
+
+    def _index(self, guild_id, player):
+        uuid = player['uuid']
+        shared = self._players.get(uuid)
+        if shared is None:
+            shared = self._players[uuid] = dict(player)
+        elif shared['platform'] != player['platform']:
+            # La plateforme est une donnée du compte : à jour sur tous les serveurs
+            shared['platform'] = player['platform']
+            for roster in self._guilds.values():
+                if uuid in roster:
+                    roster[uuid]['platform'] = player['platform']
+        roster = self._guilds.setdefault(guild_id, {})
+        previous = roster.get(uuid)
+        if previous is not None:
+            self._names.pop((guild_id, name_key(previous['name'])), None)
+        entry = roster[uuid] = {'name': player['name'], 'uuid': uuid, 'platform': shared['platform']}
+        self._names[(guild_id, name_key(entry['name']))] = uuid
+        return entry
+
+    def _unindex(self, guild_id, uuid):
+        roster = self._guilds.get(guild_id, {})
+        player = roster.pop(uuid, None)
+        if player is None:
+            return
+        self._names.pop((guild_id, name_key(player['name'])), None)
+        if not roster:
+            self._guilds.pop(guild_id, None)
+        if not any(uuid in r for r in self._guilds.values()):
+            del self._players[uuid]
+
+    def __len__(self):
+        return len(self._players)
+
+    def guilds(self):
+        """Serveurs qui suivent au moins un joueur."""
+        return list(self._guilds)
+
+    def all(self, guild_ids=None):
+        """
+        Comptes suivis par les serveurs donnés (tous si None), chacun une seule
+        fois même s'il est suivi sur plusieurs serveurs, dans l'ordre d'ajout
+        (avec le pseudo du premier serveur qui l'a ajouté).
+        """
+        if guild_ids is None:
+            return list(self._players.values())
+        players = {}
+        for guild_id in guild_ids:
+            for uuid in self._guilds.get(guild_id, {}):
+                players.setdefault(uuid, self._players[uuid])
+        return list(players.values())
+
+    def roster(self, guild_id):
+        """Joueurs suivis par un serveur, dans l'ordre d'ajout."""
+        return list(self._guilds.get(guild_id, {}).values())
+
+    def entry(self, guild_id, uuid):
+        """Entrée du serveur pour ce compte (avec son pseudo sur ce serveur), None s'il n'y est pas suivi."""
+        return self._guilds.get(guild_id, {}).get(uuid)
+
+    def tracks(self, guild_id, uuid):
+        """Le compte est-il déjà suivi par ce serveur (quel que soit son pseudo) ?"""
+        return self.entry(guild_id, uuid) is not None
+
+    def find(self, guild_id, name):
+        uuid = self._names.get((guild_id, name_key(name)))
+        return self.entry(guild_id, uuid) if uuid else None
+
+    def by_puuid(self, puuid):
+        return self._players.get(puuid)
+
+    async def add(self, guild_id, name, uuid, platform=LEGACY_PLATFORM):
+        await self.storage.add_player(guild_id, name, uuid, platform)
+        return self._index(guild_id, {'name': name, 'uuid': uuid, 'platform': platform})
+
+    async def add_many(self, guild_id, players):
+        """Ajoute [{'name', 'uuid', 'platform'}] au serveur : une seule écriture pour tous."""
+        if not players:
+            return []
+        await self.storage.add_players(guild_id, players)
+        return [self._index(guild_id, dict(p)) for p in players]
+
+    async def remove(self, guild_id, name):
+        """Retire le joueur du serveur, renvoie False s'il n'y était pas suivi."""
+        player = self.find(guild_id, name)
+        if player is None:
+            return False
+        await self.storage.remove_player(guild_id, player['uuid'])
+        self._unindex(guild_id, player['uuid'])
+        return True
+
+    async def clear(self, guild_id):
+        await self.storage.remove_all_players(guild_id)
+        for uuid in list(self._guilds.get(guild_id, {})):
+            self._unindex(guild_id, uuid)
+
+    async def move_guild(self, old_guild_id, new_guild_id):
+        await self.storage.move_guild(old_guild_id, new_guild_id)
+        for player in self.roster(old_guild_id):
+            self._unindex(old_guild_id, player['uuid'])
+            # Comme en base (UPDATE OR IGNORE) : compte ou pseudo déjà présent -> ignoré
+            if self.entry(new_guild_id, player['uuid']) is None and not self.find(new_guild_id, player['name']):
+                self._index(new_guild_id, player)
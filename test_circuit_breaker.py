@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+
+from riot_api import CircuitBreaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("riot_api.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(threshold=3, cooldown=30)
+
+    def _open(self):
+        for _ in range(3):
+            self.breaker.failure()
+
+    def test_opens_after_threshold(self):
+        self.assertFalse(self.breaker.failure())
+        self.assertFalse(self.breaker.failure())
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.failure())
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_failures(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.breaker.success()
+        self.assertFalse(self.breaker.failure())
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_lets_one_probe_through(self):
+        self._open()
+        self.now += 30
+        self.assertEqual(self.breaker.state, "half-open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_success_closes(self):
+        self._open()
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_failure_reopens(self):
+        self._open()
+        self.now += 30
+        self.breaker.allow()
+        self.assertTrue(self.breaker.failure())
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_lost_probe_is_retried_after_cooldown(self):
+        # Requête d'essai qui n'a jamais abouti (annulée) : une autre passe au cooldown suivant
+        self._open()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.now += 10
+        self.assertFalse(self.breaker.allow())
+        self.now += 20
+        self.assertTrue(self.breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
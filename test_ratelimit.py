@@ -0,0 +1,117 @@
+import asyncio
+import time
+import unittest
+
+from ratelimit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RateLimiter, parse_limits
+
+
+class ParseLimitsTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_limits("20:1,100:120"), [(20, 1), (100, 120)])
+
+    def test_ignore_garbage(self):
+        self.assertEqual(parse_limits(None), [])
+        self.assertEqual(parse_limits("x:1,5,3:2"), [(3, 2)])
+
+
+class RateLimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def _served_order(self, limiter, requests):
+        """Lance les demandes [(nom, endpoint, priorité)] et renvoie l'ordre où elles sont servies."""
+        order = []
+
+        async def one(name, method, priority):
+            await limiter.acquire(method, priority)
+            order.append(name)
+
+        tasks = [asyncio.ensure_future(one(*r)) for r in requests]
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        return order
+
+    async def test_priority_then_arrival(self):
+        # Un jeton toutes les 20 ms : tout le monde attend, l'ordre est celui du limiteur
+        limiter = RateLimiter(app_limits=[(1, 0.02)])
+        await limiter.acquire("m")
+        order = await self._served_order(limiter, [
+            ("bg1", "m", PRIORITY_BACKGROUND),
+            ("bg2", "m", PRIORITY_BACKGROUND),
+            ("cmd1", "m", PRIORITY_INTERACTIVE),
+            ("cmd2", "m", PRIORITY_INTERACTIVE),
+        ])
+        self.assertEqual(order, ["cmd1", "cmd2", "bg1", "bg2"])
+
+    async def test_priority_across_methods(self):
+        limiter = RateLimiter(app_limits=[(1, 0.02)])
+        await limiter.acquire("a")
+        order = await self._served_order(limiter, [
+            ("bg", "a", PRIORITY_BACKGROUND),
+            ("cmd", "b", PRIORITY_INTERACTIVE),
+        ])
+        self.assertEqual(order, ["cmd", "bg"])
+
+    async def test_blocked_method_does_not_block_others(self):
+        limiter = RateLimiter(app_limits=[(100, 1)])
+        limiter.block("slow", retry_after=10)
+        blocked = asyncio.ensure_future(limiter.acquire("slow"))
+        await asyncio.wait_for(limiter.acquire("fast"), 1)
+        self.assertFalse(blocked.done())
+        self.assertEqual(limiter.queue_depth, 1)
+        blocked.cancel()
+
+    async def test_application_block_blocks_everything(self):
+        limiter = RateLimiter(app_limits=[(100, 1)])
+        limiter.block("a", retry_after=0.05, limit_type="application")
+        start = time.monotonic()
+        await asyncio.wait_for(limiter.acquire("b"), 1)
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    async def test_bucket_window(self):
+        limiter = RateLimiter(app_limits=[(2, 0.05)])
+        start = time.monotonic()
+        for _ in range(3):
+            await asyncio.wait_for(limiter.acquire("m"), 1)
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    async def test_headers_sync_counts(self):
+        limiter = RateLimiter(app_limits=[(20, 1)])
+        limiter.update_from_headers("m", {
+            "X-App-Rate-Limit": "20:1",
+            "X-App-Rate-Limit-Count": "20:1",
+            "X-Method-Rate-Limit": "5:10",
+            "X-Method-Rate-Limit-Count": "1:10",
+        })
+        waiter = asyncio.ensure_future(limiter.acquire("m"))
+        await asyncio.sleep(0.05)
+        # Le compteur app annoncé par Riot est plein : il faut attendre la fenêtre suivante
+        self.assertFalse(waiter.done())
+        self.assertEqual(limiter.method_limits["m"], [(5, 10)])
+        waiter.cancel()
+
+    async def test_cancelled_waiters_leave_the_queue(self):
+        limiter = RateLimiter(app_limits=[(1, 60)])
+        await limiter.acquire("m")
+        waiters = [asyncio.ensure_future(limiter.acquire("m")) for _ in range(10)]
+        await asyncio.sleep(0)
+        self.assertEqual(limiter.queue_depth, 10)
+        for w in waiters[:9]:
+            w.cancel()
+        await asyncio.gather(*waiters[:9], return_exceptions=True)
+        self.assertEqual(limiter.queue_depth, 1)
+        waiters[9].cancel()
+        await asyncio.gather(waiters[9], return_exceptions=True)
+        self.assertEqual(limiter.queue_depth, 0)
+
+    async def test_large_backlog_is_linear(self):
+        # Backfill de tout le roster : des dizaines de milliers de demandes d'un coup.
+        # Sans le mode debug d'asyncio (activé par IsolatedAsyncioTestCase), qui fausse la mesure
+        asyncio.get_running_loop().set_debug(False)
+        limiter = RateLimiter(app_limits=[(10 ** 9, 1)])
+        start = time.process_time()
+        await asyncio.wait_for(asyncio.gather(*(
+            limiter.acquire(f"m{i % 4}", PRIORITY_BACKGROUND) for i in range(20000)
+        )), 30)
+        self.assertLess(time.process_time() - start, 5)
+        self.assertEqual(limiter.queue_depth, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()